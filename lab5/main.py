@@ -1,693 +1,17 @@
 import os
-import struct
-import time
+import queue
+import posixpath
+import functools
+import threading
 from datetime import datetime
 from tkinter import *
 from tkinter import ttk, filedialog, messagebox, simpledialog
-from collections import deque
-
-
-# ==================== ФАЙЛОВАЯ СИСТЕМА ====================
-
-class SimpleFS:
-    def __init__(self, filename=None):
-        self.filename = filename
-        self.cluster_size = 1  # 1 байт на кластер
-        self.max_name_len = 16
-        self.max_files_per_dir = 16
-        self.dir_entry_size = 30  # 1 + 1 + 16 + 4 + 4 + 4 = 30 байт
-        self.current_dir_cluster = None
-        self.dir_stack = []  # стек для навигации по каталогам
-
-    def create_image(self, total_clusters, filename):
-        """Создание образа файловой системы"""
-        with open(filename, 'wb') as f:
-            # 1. Размер ФС в кластерах (4 байта)
-            f.write(struct.pack('I', total_clusters))
-
-            # 2. Размер битовой карты в байтах (4 байта)
-            bitmap_bytes = (total_clusters + 7) // 8
-            f.write(struct.pack('I', bitmap_bytes))
-
-            # 3. Битовая карта свободных блоков
-            bitmap = bytearray([255] * bitmap_bytes)
-
-            # Пометить первые N кластеров как занятые
-            header_size = 8
-            clusters_for_header = (header_size + self.cluster_size - 1) // self.cluster_size
-
-            clusters_for_bitmap = (bitmap_bytes + self.cluster_size - 1) // self.cluster_size
-
-            root_dir_size = self.max_files_per_dir * self.dir_entry_size
-            clusters_for_root = (root_dir_size + self.cluster_size - 1) // self.cluster_size
-
-            total_used_clusters = clusters_for_header + clusters_for_bitmap + clusters_for_root
-
-            for i in range(total_used_clusters):
-                byte_idx = i // 8
-                bit_idx = i % 8
-                bitmap[byte_idx] &= ~(1 << bit_idx)
-
-            f.write(bitmap)
-
-            # 4. Корневой каталог
-            root_dir = bytearray(self.max_files_per_dir * self.dir_entry_size)
-
-            # Запись текущего каталога '.'
-            root_dir[0] = 1  # занята
-            root_dir[1] = 1  # каталог
-            root_dir[2:18] = b'.' + b'\0' * 15
-            root_dir_cluster = clusters_for_header + clusters_for_bitmap
-            root_dir[18:22] = struct.pack('I', root_dir_cluster)
-            root_dir[22:26] = struct.pack('I', root_dir_cluster + clusters_for_root - 1)
-            root_dir[26:30] = struct.pack('I', 1)  # только запись '.'
-
-            # Запись родительского каталога '..' (ссылка на себя для корня)
-            root_dir[30:60] = bytearray(self.dir_entry_size)
-            root_dir[30] = 1  # занята
-            root_dir[31] = 1  # каталог
-            root_dir[32:48] = b'..' + b'\0' * 14
-            root_dir[48:52] = struct.pack('I', root_dir_cluster)  # тот же каталог
-            root_dir[52:56] = struct.pack('I', root_dir_cluster + clusters_for_root - 1)
-            root_dir[56:60] = struct.pack('I', 2)  # две записи: '.' и '..'
-
-            f.write(root_dir)
-
-            # 5. Заполнить оставшееся пространство нулями
-            total_bytes = total_clusters * self.cluster_size
-            current_pos = f.tell()
-            remaining = total_bytes - current_pos
-            if remaining > 0:
-                f.write(b'\0' * remaining)
-
-        self.filename = filename
-        self.total_clusters = total_clusters
-        self.bitmap_bytes = bitmap_bytes
-        self.root_dir_cluster = root_dir_cluster
-        self.current_dir_cluster = root_dir_cluster
-        self.dir_stack = [(root_dir_cluster, "/")]
-        return True
-
-    def mount(self, filename):
-        """Монтирование файловой системы"""
-        self.filename = filename
-        if not os.path.exists(filename):
-            return False
-
-        with open(filename, 'rb') as f:
-            self.total_clusters = struct.unpack('I', f.read(4))[0]
-            self.bitmap_bytes = struct.unpack('I', f.read(4))[0]
-
-            # Пропускаем битовую карту
-            f.seek(self.bitmap_bytes, 1)
-
-            # Определяем положение корневого каталога
-            first_entry = f.read(self.dir_entry_size)
-            self.root_dir_cluster = struct.unpack('I', first_entry[18:22])[0]
-            self.current_dir_cluster = self.root_dir_cluster
-            self.dir_stack = [(self.root_dir_cluster, "/")]
-
-        return True
-
-    def read_bitmap(self):
-        """Чтение битовой карты"""
-        with open(self.filename, 'rb') as f:
-            f.seek(8)
-            bitmap = f.read(self.bitmap_bytes)
-        return bitmap
-
-    def find_free_clusters(self, count):
-        """Поиск свободных кластеров"""
-        bitmap = self.read_bitmap()
-        free_clusters = []
-
-        for byte_idx in range(len(bitmap)):
-            byte = bitmap[byte_idx]
-            for bit_idx in range(8):
-                cluster_idx = byte_idx * 8 + bit_idx
-                if cluster_idx >= self.total_clusters:
-                    break
-                if (byte >> bit_idx) & 1:
-                    free_clusters.append(cluster_idx)
-                    if len(free_clusters) >= count:
-                        return free_clusters
-        return None
-
-    def allocate_clusters(self, clusters):
-        """Выделение кластеров"""
-        bitmap = bytearray(self.read_bitmap())
-        for cluster in clusters:
-            byte_idx = cluster // 8
-            bit_idx = cluster % 8
-            bitmap[byte_idx] &= ~(1 << bit_idx)
-
-        with open(self.filename, 'r+b') as f:
-            f.seek(8)
-            f.write(bitmap)
-
-    def free_clusters(self, clusters):
-        """Освобождение кластеров"""
-        bitmap = bytearray(self.read_bitmap())
-        for cluster in clusters:
-            byte_idx = cluster // 8
-            bit_idx = cluster % 8
-            bitmap[byte_idx] |= (1 << bit_idx)
-
-        with open(self.filename, 'r+b') as f:
-            f.seek(8)
-            f.write(bitmap)
-
-    def read_dir(self, dir_cluster=None):
-        """Чтение содержимого каталога"""
-        if dir_cluster is None:
-            dir_cluster = self.current_dir_cluster
-
-        entries = []
-
-        with open(self.filename, 'rb') as f:
-            f.seek(dir_cluster)
-
-            for i in range(self.max_files_per_dir):
-                entry_data = f.read(self.dir_entry_size)
-                if not entry_data:
-                    break
-
-                is_occupied = entry_data[0]
-                if not is_occupied:
-                    continue
-
-                entry_type = entry_data[1]
-                name = entry_data[2:18].decode('ascii', errors='ignore').rstrip('\0')
-
-                if not name or name == '.' or name == '..':
-                    continue
-
-                start_cluster = struct.unpack('I', entry_data[18:22])[0]
-                end_cluster = struct.unpack('I', entry_data[22:26])[0]
-                num_entries = struct.unpack('I', entry_data[26:30])[0] if entry_type == 1 else 0
-
-                size = (end_cluster - start_cluster + 1) * self.cluster_size if start_cluster <= end_cluster else 0
-
-                entries.append({
-                    'name': name,
-                    'is_dir': entry_type == 1,
-                    'size': size,
-                    'start_cluster': start_cluster,
-                    'end_cluster': end_cluster,
-                    'num_entries': num_entries,
-                    'occupied': is_occupied
-                })
-
-        return entries
-
-    def find_free_dir_entry(self, dir_cluster):
-        """Поиск свободной записи в каталоге"""
-        with open(self.filename, 'rb') as f:
-            f.seek(dir_cluster)
-
-            for i in range(self.max_files_per_dir):
-                f.seek(dir_cluster + i * self.dir_entry_size)
-                entry_data = f.read(self.dir_entry_size)
-
-                if not entry_data or entry_data[0] == 0:
-                    return i
-
-        return None
-
-    def update_dir_entry_count(self, dir_cluster, delta):
-        """Обновление счетчика записей в каталоге"""
-        with open(self.filename, 'r+b') as f:
-            # Находим запись текущего каталога '.'
-            f.seek(dir_cluster)
-            for i in range(self.max_files_per_dir):
-                f.seek(dir_cluster + i * self.dir_entry_size)
-                entry_data = f.read(self.dir_entry_size)
-
-                if entry_data[0] == 1 and entry_data[1] == 1:
-                    name = entry_data[2:18].decode('ascii', errors='ignore').rstrip('\0')
-                    if name == '.':
-                        current_count = struct.unpack('I', entry_data[26:30])[0]
-                        new_count = max(2, current_count + delta)  # минимум 2 ('.' и '..')
-
-                        f.seek(dir_cluster + i * self.dir_entry_size + 26)
-                        f.write(struct.pack('I', new_count))
-                        break
-
-    def copy_to_fs(self, src_path, dest_name, dest_dir_cluster=None):
-        """Копирование файла в файловую систему"""
-        if dest_dir_cluster is None:
-            dest_dir_cluster = self.current_dir_cluster
-
-        if len(dest_name) > self.max_name_len:
-            return False, "Имя файла слишком длинное"
-
-        # Проверить, существует ли уже файл с таким именем
-        entries = self.read_dir(dest_dir_cluster)
-        for entry in entries:
-            if entry['name'] == dest_name:
-                return False, "Файл с таким именем уже существует"
-
-        # Прочитать исходный файл
-        try:
-            with open(src_path, 'rb') as f:
-                data = f.read()
-        except:
-            return False, "Не удалось прочитать исходный файл"
-
-        file_size = len(data)
-        clusters_needed = (file_size + self.cluster_size - 1) // self.cluster_size
-
-        # Найти свободные кластеры
-        free_clusters = self.find_free_clusters(clusters_needed)
-        if not free_clusters or len(free_clusters) < clusters_needed:
-            return False, "Недостаточно свободного места"
-
-        # Найти свободную запись в каталоге
-        entry_idx = self.find_free_dir_entry(dest_dir_cluster)
-        if entry_idx is None:
-            return False, "Каталог полон"
-
-        # Записать данные файла
-        with open(self.filename, 'r+b') as f:
-            for i in range(clusters_needed):
-                cluster = free_clusters[i]
-                f.seek(cluster)
-
-                start_idx = i * self.cluster_size
-                end_idx = min(start_idx + self.cluster_size, file_size)
-                chunk = data[start_idx:end_idx]
-
-                if len(chunk) < self.cluster_size:
-                    chunk += b'\0' * (self.cluster_size - len(chunk))
-
-                f.write(chunk)
-
-            # Записать запись в каталог
-            entry_pos = dest_dir_cluster + entry_idx * self.dir_entry_size
-            f.seek(entry_pos)
-
-            entry = bytearray(self.dir_entry_size)
-            entry[0] = 1
-            entry[1] = 0
-            entry[2:18] = dest_name.ljust(16, '\0').encode('ascii')
-            entry[18:22] = struct.pack('I', free_clusters[0])
-            entry[22:26] = struct.pack('I', free_clusters[clusters_needed - 1])
-            entry[26:30] = struct.pack('I', 0)
-
-            f.write(entry)
-
-        # Обновить битовую карту
-        self.allocate_clusters(free_clusters[:clusters_needed])
-
-        # Обновить счетчик записей в каталоге
-        self.update_dir_entry_count(dest_dir_cluster, 1)
-
-        return True, "Файл успешно скопирован"
-
-    def copy_from_fs(self, src_name, dest_path, src_dir_cluster=None):
-        """Копирование файла из файловой системы"""
-        if src_dir_cluster is None:
-            src_dir_cluster = self.current_dir_cluster
-
-        entries = self.read_dir(src_dir_cluster)
-        file_entry = None
-
-        for entry in entries:
-            if entry['name'] == src_name and not entry['is_dir']:
-                file_entry = entry
-                break
-
-        if not file_entry:
-            return False, "Файл не найден"
-
-        # Прочитать данные файла
-        data = bytearray()
-        start_cluster = file_entry['start_cluster']
-        end_cluster = file_entry['end_cluster']
-
-        with open(self.filename, 'rb') as f:
-            for cluster in range(start_cluster, end_cluster + 1):
-                f.seek(cluster)
-                chunk = f.read(self.cluster_size)
-                data.extend(chunk)
-
-        actual_size = file_entry['size']
-        data = data[:actual_size]
-
-        # Записать файл
-        try:
-            with open(dest_path, 'wb') as f:
-                f.write(data)
-            return True, "Файл успешно скопирован"
-        except:
-            return False, "Не удалось записать файл"
-
-    def delete_item(self, name, is_dir=False):
-        """Удаление файла или каталога"""
-        entries = self.read_dir(self.current_dir_cluster)
-        item_entry = None
-
-        for entry in entries:
-            if entry['name'] == name and entry['is_dir'] == is_dir:
-                item_entry = entry
-                break
-
-        if not item_entry:
-            return False, "Элемент не найден"
-
-        if is_dir:
-            # Рекурсивно удалить содержимое каталога
-            success, message = self.delete_directory_contents(item_entry['start_cluster'])
-            if not success:
-                return False, message
-
-        # Освободить кластеры
-        clusters = list(range(item_entry['start_cluster'], item_entry['end_cluster'] + 1))
-        self.free_clusters(clusters)
-
-        # Найти и удалить запись в каталоге
-        with open(self.filename, 'r+b') as f:
-            f.seek(self.current_dir_cluster)
-
-            for i in range(self.max_files_per_dir):
-                f.seek(self.current_dir_cluster + i * self.dir_entry_size)
-                entry_data = f.read(self.dir_entry_size)
-
-                if entry_data[0] == 1:
-                    entry_name = entry_data[2:18].decode('ascii', errors='ignore').rstrip('\0')
-
-                    if entry_name == name:
-                        # Пометить запись как свободную
-                        f.seek(self.current_dir_cluster + i * self.dir_entry_size)
-                        f.write(b'\0' * self.dir_entry_size)
-
-                        # Обновить счетчик записей
-                        self.update_dir_entry_count(self.current_dir_cluster, -1)
-
-                        return True, f"{'Каталог' if is_dir else 'Файл'} успешно удален"
-
-        return False, "Ошибка при удалении"
-
-    def delete_directory_contents(self, dir_cluster):
-        """Рекурсивное удаление содержимого каталога"""
-        # Читаем записи каталога
-        entries = []
-        with open(self.filename, 'rb') as f:
-            f.seek(dir_cluster)
-
-            for i in range(self.max_files_per_dir):
-                entry_data = f.read(self.dir_entry_size)
-                if not entry_data or entry_data[0] == 0:
-                    continue
-
-                entry_type = entry_data[1]
-                name = entry_data[2:18].decode('ascii', errors='ignore').rstrip('\0')
-
-                if name in ('.', '..'):
-                    continue
-
-                start_cluster = struct.unpack('I', entry_data[18:22])[0]
-                end_cluster = struct.unpack('I', entry_data[22:26])[0]
-
-                entries.append({
-                    'name': name,
-                    'is_dir': entry_type == 1,
-                    'start_cluster': start_cluster,
-                    'end_cluster': end_cluster
-                })
-
-        # Рекурсивно удаляем содержимое
-        for entry in entries:
-            if entry['is_dir']:
-                # Рекурсивно удаляем подкаталог
-                success, message = self.delete_directory_contents(entry['start_cluster'])
-                if not success:
-                    return False, f"Ошибка при удалении каталога {entry['name']}: {message}"
-
-            # Освобождаем кластеры
-            clusters = list(range(entry['start_cluster'], entry['end_cluster'] + 1))
-            self.free_clusters(clusters)
-
-            # Помечаем запись как свободную
-            with open(self.filename, 'r+b') as f:
-                # Находим запись
-                f.seek(dir_cluster)
-                for i in range(self.max_files_per_dir):
-                    f.seek(dir_cluster + i * self.dir_entry_size)
-                    entry_data = f.read(self.dir_entry_size)
-
-                    if entry_data[0] == 1:
-                        entry_name = entry_data[2:18].decode('ascii', errors='ignore').rstrip('\0')
-                        if entry_name == entry['name']:
-                            f.seek(dir_cluster + i * self.dir_entry_size)
-                            f.write(b'\0' * self.dir_entry_size)
-                            break
-
-        # Обновляем счетчик записей в каталоге
-        self.update_dir_entry_count(dir_cluster, -len(entries))
-
-        return True, "Содержимое каталога удалено"
-
-    def rename_item(self, old_name, new_name):
-        """Переименование файла или каталога"""
-        if len(new_name) > self.max_name_len:
-            return False, "Новое имя слишком длинное"
-
-        # Проверить, существует ли уже элемент с таким именем
-        entries = self.read_dir(self.current_dir_cluster)
-        for entry in entries:
-            if entry['name'] == new_name:
-                return False, "Элемент с таким именем уже существует"
-
-        with open(self.filename, 'r+b') as f:
-            f.seek(self.current_dir_cluster)
-
-            for i in range(self.max_files_per_dir):
-                f.seek(self.current_dir_cluster + i * self.dir_entry_size)
-                entry_data = f.read(self.dir_entry_size)
-
-                if entry_data[0] == 1:
-                    name = entry_data[2:18].decode('ascii', errors='ignore').rstrip('\0')
-
-                    if name == old_name:
-                        f.seek(self.current_dir_cluster + i * self.dir_entry_size + 2)
-                        f.write(new_name.ljust(16, '\0').encode('ascii'))
-
-                        return True, "Успешно переименовано"
-
-        return False, "Элемент не найден"
-
-    def create_directory(self, dir_name, parent_dir_cluster=None):
-        """Создание каталога"""
-        if parent_dir_cluster is None:
-            parent_dir_cluster = self.current_dir_cluster
-
-        if len(dir_name) > self.max_name_len:
-            return False, "Имя каталога слишком длинное"
-
-        # Проверить, существует ли уже каталог с таким именем
-        entries = self.read_dir(parent_dir_cluster)
-        for entry in entries:
-            if entry['name'] == dir_name:
-                return False, "Каталог с таким именем уже существует"
-
-        # Найти свободные кластеры для нового каталога
-        dir_size = self.max_files_per_dir * self.dir_entry_size
-        clusters_needed = (dir_size + self.cluster_size - 1) // self.cluster_size
-
-        free_clusters = self.find_free_clusters(clusters_needed)
-        if not free_clusters or len(free_clusters) < clusters_needed:
-            return False, "Недостаточно свободного места"
-
-        # Найти свободную запись в родительском каталоге
-        entry_idx = self.find_free_dir_entry(parent_dir_cluster)
-        if entry_idx is None:
-            return False, "Каталог полон"
-
-        # Создать новый каталог
-        new_dir = bytearray(clusters_needed * self.cluster_size)
-
-        # Запись текущего каталога '.'
-        new_dir[0] = 1
-        new_dir[1] = 1
-        new_dir[2:18] = b'.' + b'\0' * 15
-        new_dir[18:22] = struct.pack('I', free_clusters[0])
-        new_dir[22:26] = struct.pack('I', free_clusters[clusters_needed - 1])
-        new_dir[26:30] = struct.pack('I', 2)  # '.' и '..'
-
-        # Запись родительского каталога '..'
-        new_dir[30] = 1
-        new_dir[31] = 1
-        new_dir[32:48] = b'..' + b'\0' * 14
-        new_dir[48:52] = struct.pack('I', parent_dir_cluster)
-        new_dir[52:56] = struct.pack('I', parent_dir_cluster +
-                                     ((self.max_files_per_dir * self.dir_entry_size +
-                                       self.cluster_size - 1) // self.cluster_size) - 1)
-        new_dir[56:60] = struct.pack('I', 2)  # '.' и '..'
-
-        # Записать каталог на диск
-        with open(self.filename, 'r+b') as f:
-            for i in range(clusters_needed):
-                f.seek(free_clusters[i])
-                start_idx = i * self.cluster_size
-                end_idx = start_idx + self.cluster_size
-                f.write(new_dir[start_idx:end_idx])
-
-            # Записать запись в родительский каталог
-            entry_pos = parent_dir_cluster + entry_idx * self.dir_entry_size
-            f.seek(entry_pos)
-
-            entry = bytearray(self.dir_entry_size)
-            entry[0] = 1
-            entry[1] = 1
-            entry[2:18] = dir_name.ljust(16, '\0').encode('ascii')
-            entry[18:22] = struct.pack('I', free_clusters[0])
-            entry[22:26] = struct.pack('I', free_clusters[clusters_needed - 1])
-            entry[26:30] = struct.pack('I', 2)
-
-            f.write(entry)
-
-        # Обновить битовую карту
-        self.allocate_clusters(free_clusters[:clusters_needed])
-
-        # Обновить счетчик записей в родительском каталоге
-        self.update_dir_entry_count(parent_dir_cluster, 1)
-
-        return True, "Каталог успешно создан"
-
-    def change_directory(self, dir_name):
-        """Смена текущего каталога"""
-        if dir_name == "..":
-            if len(self.dir_stack) > 1:
-                # Возвращаемся на уровень выше
-                self.dir_stack.pop()
-                self.current_dir_cluster, _ = self.dir_stack[-1]
-                return True, "Переход в родительский каталог"
-            else:
-                return False, "Уже в корневом каталоге"
-
-        elif dir_name == "/":
-            # Переход в корень
-            self.dir_stack = [(self.root_dir_cluster, "/")]
-            self.current_dir_cluster = self.root_dir_cluster
-            return True, "Переход в корневой каталог"
-
-        else:
-            # Поиск каталога
-            entries = self.read_dir(self.current_dir_cluster)
-            target_dir = None
-
-            for entry in entries:
-                if entry['name'] == dir_name and entry['is_dir']:
-                    target_dir = entry
-                    break
-
-            if not target_dir:
-                return False, "Каталог не найден"
-
-            # Добавляем в стек
-            path = self.dir_stack[-1][1]
-            if path == "/":
-                new_path = f"/{dir_name}"
-            else:
-                new_path = f"{path}/{dir_name}"
-
-            self.dir_stack.append((target_dir['start_cluster'], new_path))
-            self.current_dir_cluster = target_dir['start_cluster']
-            return True, f"Переход в каталог {dir_name}"
-
-    def get_current_path(self):
-        """Получить текущий путь"""
-        return self.dir_stack[-1][1]
-
-    def move_item(self, src_name, dest_dir_cluster, dest_name=None):
-        """Перемещение файла или каталога"""
-        if dest_name is None:
-            dest_name = src_name
-
-        if len(dest_name) > self.max_name_len:
-            return False, "Имя файла слишком длинное"
-
-        # Найти исходный элемент
-        entries = self.read_dir(self.current_dir_cluster)
-        src_entry = None
-
-        for entry in entries:
-            if entry['name'] == src_name:
-                src_entry = entry
-                break
-
-        if not src_entry:
-            return False, "Исходный элемент не найден"
-
-        # Проверить, существует ли уже элемент с таким именем в целевом каталоге
-        dest_entries = self.read_dir(dest_dir_cluster)
-        for entry in dest_entries:
-            if entry['name'] == dest_name:
-                return False, "Элемент с таким именем уже существует в целевом каталоге"
-
-        # Найти свободную запись в целевом каталоге
-        entry_idx = self.find_free_dir_entry(dest_dir_cluster)
-        if entry_idx is None:
-            return False, "Целевой каталог полон"
-
-        # Скопировать запись в целевой каталог
-        with open(self.filename, 'r+b') as f:
-            # Читаем исходную запись
-            f.seek(self.current_dir_cluster)
-            src_entry_pos = None
-            src_entry_data = None
-
-            for i in range(self.max_files_per_dir):
-                f.seek(self.current_dir_cluster + i * self.dir_entry_size)
-                entry_data = f.read(self.dir_entry_size)
-
-                if entry_data[0] == 1:
-                    name = entry_data[2:18].decode('ascii', errors='ignore').rstrip('\0')
-                    if name == src_name:
-                        src_entry_pos = self.current_dir_cluster + i * self.dir_entry_size
-                        src_entry_data = bytearray(entry_data)
-                        break
-
-            if not src_entry_data:
-                return False, "Не удалось найти исходную запись"
-
-            # Записываем в целевой каталог
-            dest_entry_pos = dest_dir_cluster + entry_idx * self.dir_entry_size
-            f.seek(dest_entry_pos)
-
-            # Обновляем имя если нужно
-            if dest_name != src_name:
-                src_entry_data[2:18] = dest_name.ljust(16, '\0').encode('ascii')
-
-            f.write(src_entry_data)
-
-            # Удаляем исходную запись
-            f.seek(src_entry_pos)
-            f.write(b'\0' * self.dir_entry_size)
-
-        # Обновляем счетчики записей
-        self.update_dir_entry_count(self.current_dir_cluster, -1)
-        self.update_dir_entry_count(dest_dir_cluster, 1)
-
-        return True, "Элемент успешно перемещен"
-
-    def get_parent_directory(self, dir_cluster):
-        """Получить кластер родительского каталога"""
-        with open(self.filename, 'rb') as f:
-            f.seek(dir_cluster)
-
-            # Ищем запись '..'
-            for i in range(self.max_files_per_dir):
-                f.seek(dir_cluster + i * self.dir_entry_size)
-                entry_data = f.read(self.dir_entry_size)
+from concurrent.futures import ThreadPoolExecutor
 
-                if entry_data[0] == 1 and entry_data[1] == 1:
-                    name = entry_data[2:18].decode('ascii', errors='ignore').rstrip('\0')
-                    if name == '..':
-                        return struct.unpack('I', entry_data[18:22])[0]
+from simplefs import (SimpleFS, OperationCancelled, DEFAULT_CLUSTER_SIZE,
+                      MIN_CLUSTER_SIZE, MAX_CLUSTER_SIZE)
 
-        return self.root_dir_cluster
+PAGE_SIZE = 500  # строк списка файлов, добавляемых за раз при прокрутке
 
 
 # ==================== GUI ====================
@@ -700,12 +24,120 @@ class FSGUI:
 
         self.fs = SimpleFS()
 
+        # Операции ФС выполняются по очереди в одном фоновом потоке;
+        # результаты и ход выполнения передаются в главный поток через очередь
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.events = queue.Queue()
+        self.jobs = []  # флаги отмены незавершенных операций
+        self.job_label = ""
+
         # Настройка стиля
         self.setup_style()
 
         # Создание виджетов
         self.create_widgets()
 
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.root.after(50, self.poll_events)
+
+    def on_close(self):
+        """Закрытие окна: отмена операций и сброс изменений образа на диск"""
+        for job in self.jobs:
+            job.set()
+        self.executor.shutdown(wait=True)
+        self.fs.unmount()
+        self.root.destroy()
+
+    # Фоновые операции
+
+    def run_async(self, label, func, *args, on_done=None, with_progress=False,
+                  cancellable=True, **kwargs):
+        """Постановка операции ФС в очередь фонового потока
+
+        on_done(result) вызывается в главном потоке. При with_progress в func
+        передается progress: через него идет ход операции и ее отмена.
+        Не начатая операция отменяется всегда, начатая - только если
+        cancellable.
+        """
+        job = threading.Event()
+        if with_progress:
+            kwargs['progress'] = functools.partial(self.job_progress, job, cancellable)
+        self.jobs.append(job)
+        self.cancel_button.config(state=NORMAL)
+
+        def run():
+            if job.is_set():
+                raise OperationCancelled()
+            self.events.put(('start', label))
+            return func(*args, **kwargs)
+
+        future = self.executor.submit(run)
+        future.add_done_callback(lambda f: self.events.put(('done', job, f, on_done)))
+
+    def job_progress(self, job, cancellable, done, total, rate):
+        """Обратный вызов progress (выполняется в фоновом потоке)"""
+        if cancellable and job.is_set():
+            raise OperationCancelled()
+        self.events.put(('progress', done, total, rate))
+
+    def poll_events(self):
+        """Обработка событий фонового потока в главном потоке"""
+        try:
+            while True:
+                event = self.events.get_nowait()
+                if event[0] == 'start':
+                    self.job_label = event[1] or ""
+                    self.progress_bar.config(value=0)
+                    if event[1]:
+                        self.update_status(f"{event[1]}...")
+                elif event[0] == 'progress':
+                    self.show_progress(*event[1:])
+                else:
+                    self.finish_job(*event[1:])
+        except queue.Empty:
+            pass
+        self.root.after(50, self.poll_events)
+
+    def finish_job(self, job, future, on_done):
+        """Завершение операции: результат передается в on_done"""
+        self.jobs.remove(job)
+        if not self.jobs:
+            self.cancel_button.config(state=DISABLED)
+            self.progress_bar.config(value=0)
+
+        try:
+            result = future.result()
+        except OperationCancelled:
+            self.update_status("Операция отменена")
+            self.update_path_display()
+            self.refresh_list()
+            return
+        except Exception as e:
+            messagebox.showerror("Ошибка", f"Операция не выполнена: {str(e)}")
+            self.update_status("Готов")
+            return
+
+        if on_done is not None:
+            on_done(result)
+
+    def cancel_jobs(self):
+        """Отмена текущей и ожидающих операций"""
+        for job in self.jobs:
+            job.set()
+        self.update_status("Отмена...")
+
+    def show_result(self, result, refresh=True):
+        """Вывод результата операции (success, message)"""
+        success, message = result
+        if success:
+            messagebox.showinfo("Успех", message)
+            if refresh:
+                self.update_path_display()
+                self.refresh_list()
+        else:
+            messagebox.showerror("Ошибка", message)
+        self.update_status("Готов")
+
     def setup_style(self):
         """Настройка стилей виджетов"""
         style = ttk.Style()
@@ -810,6 +242,10 @@ class FSGUI:
         file_ops = [
             ("📥 Копировать в ФС", self.copy_to_fs_gui),
             ("📤 Копировать из ФС", self.copy_from_fs_gui),
+            ("📦 Импорт каталога", self.import_tree_gui),
+            ("🗃 Экспорт каталога", self.export_tree_gui),
+            ("🧹 Дефрагментация", self.defragment_gui),
+            ("🩺 Проверка ФС", self.check_gui),
             ("✏️ Переименовать", self.rename_gui),
             ("➡️ Переместить", self.move_item_gui),
             ("🗑️ Удалить файл", self.delete_file_gui),
@@ -838,9 +274,10 @@ class FSGUI:
         info_frame = ttk.LabelFrame(left_frame, text="Информация о ФС", padding=10)
         info_frame.pack(fill=X, pady=(20, 0))
 
-        ttk.Label(info_frame, text="Размер кластера: 1 байт").pack(anchor=W)
+        self.cluster_info_label = ttk.Label(info_frame, text="Размер кластера: —")
+        self.cluster_info_label.pack(anchor=W)
         ttk.Label(info_frame, text="Имя: до 16 символов").pack(anchor=W)
-        ttk.Label(info_frame, text="Файлов в каталоге: ≤16").pack(anchor=W)
+        ttk.Label(info_frame, text="Файлов в каталоге: без ограничения").pack(anchor=W)
 
     def create_right_panel(self, parent):
         """Создание правой панели со списком файлов"""
@@ -874,10 +311,26 @@ class FSGUI:
         self.tree.column('clusters', width=100)
         self.tree.column('status', width=100)
 
-        # Полосы прокрутки
+        self.tree.tag_configure('directory', foreground='#0066cc')
+        self.tree.tag_configure('file', foreground='#333333')
+
+        # Строки создаются страницами: показанный каталог, все его записи,
+        # число уже отображенных и их значения (идентификатор строки - имя записи)
+        self.listing_path = None
+        self.listing = []
+        self.rendered = 0
+        self.rows = {}
+
+        # Полосы прокрутки; у конца списка подгружается следующая страница
         v_scrollbar = ttk.Scrollbar(tree_frame, orient=VERTICAL, command=self.tree.yview)
         h_scrollbar = ttk.Scrollbar(tree_frame, orient=HORIZONTAL, command=self.tree.xview)
-        self.tree.configure(yscrollcommand=v_scrollbar.set, xscrollcommand=h_scrollbar.set)
+
+        def on_scroll(first, last):
+            v_scrollbar.set(first, last)
+            if float(last) > 0.9 and self.rendered < len(self.listing):
+                self.root.after_idle(self.render_more)
+
+        self.tree.configure(yscrollcommand=on_scroll, xscrollcommand=h_scrollbar.set)
 
         self.tree.grid(row=0, column=0, sticky='nsew')
         v_scrollbar.grid(row=0, column=1, sticky='ns')
@@ -894,14 +347,69 @@ class FSGUI:
         self.status_var = StringVar()
         self.status_var.set("Готов")
 
-        status_bar = ttk.Label(self.root, textvariable=self.status_var,
+        status_frame = ttk.Frame(self.root)
+        status_frame.pack(side=BOTTOM, fill=X)
+
+        # Панель статистики ввода-вывода (обновляется, пока включена)
+        self.stats_enabled = BooleanVar(value=False)
+        self._stats_job = None
+        ttk.Checkbutton(status_frame, text="📊 Статистика", variable=self.stats_enabled,
+                        command=self.toggle_stats).pack(side=RIGHT, padx=5)
+        self.stats_var = StringVar()
+        ttk.Label(status_frame, textvariable=self.stats_var,
+                  relief=SUNKEN, anchor=E, padding=(10, 5)).pack(side=RIGHT)
+
+        # Ход и отмена фоновой операции
+        self.cancel_button = ttk.Button(status_frame, text="✖ Отмена",
+                                        command=self.cancel_jobs, state=DISABLED)
+        self.cancel_button.pack(side=RIGHT, padx=5)
+        self.progress_bar = ttk.Progressbar(status_frame, mode='determinate',
+                                            maximum=100, length=200)
+        self.progress_bar.pack(side=RIGHT, padx=5)
+
+        status_bar = ttk.Label(status_frame, textvariable=self.status_var,
                                relief=SUNKEN, anchor=W, padding=(10, 5))
-        status_bar.pack(side=BOTTOM, fill=X)
+        status_bar.pack(side=LEFT, fill=X, expand=True)
+
+    def toggle_stats(self):
+        """Включение и выключение сбора статистики"""
+        self.fs.enable_stats(self.stats_enabled.get())
+        if self._stats_job is not None:
+            self.root.after_cancel(self._stats_job)
+            self._stats_job = None
+        if self.stats_enabled.get():
+            self.update_stats_panel()
+        else:
+            self.stats_var.set("")
+
+    def update_stats_panel(self):
+        """Обновление панели статистики раз в полсекунды"""
+        stats = self.fs.stats()
+        if stats is None:
+            return
+
+        mb = 1024 * 1024
+        text = (f"Вызовов: {sum(count for count, _ in stats['calls'].values())} | "
+                f"чтений: {stats['reads']} ({stats['bytes_read'] / mb:.1f} МБ) | "
+                f"записей: {stats['writes']} ({stats['bytes_written'] / mb:.1f} МБ) | "
+                f"открытий: {stats['opens']} | fsync: {stats['syncs']}")
+        if stats['last'] is not None:
+            name, elapsed = stats['last']
+            text += f" | {name}: {elapsed * 1000:.1f} мс"
+        self.stats_var.set(text)
+        self._stats_job = self.root.after(500, self.update_stats_panel)
 
     def update_status(self, message):
         self.status_var.set(message)
         self.root.update_idletasks()
 
+    def show_progress(self, done, total, rate):
+        """Отображение хода операции в строке состояния"""
+        percent = done * 100 // total if total else 100
+        self.progress_bar.config(value=percent)
+        self.update_status(f"{self.job_label or 'Выполнение'}: {percent}% "
+                           f"({rate / (1024 * 1024):.1f} МБ/с)")
+
     def update_path_display(self):
         """Обновление отображения текущего пути"""
         if self.fs.filename:
@@ -918,6 +426,14 @@ class FSGUI:
         if not size:
             return
 
+        cluster_size = simpledialog.askinteger("Создание образа",
+                                               "Размер кластера в байтах (степень двойки):",
+                                               initialvalue=DEFAULT_CLUSTER_SIZE,
+                                               minvalue=MIN_CLUSTER_SIZE,
+                                               maxvalue=MAX_CLUSTER_SIZE)
+        if not cluster_size:
+            return
+
         filename = filedialog.asksaveasfilename(
             title="Сохранить образ как",
             defaultextension=".fs",
@@ -925,64 +441,117 @@ class FSGUI:
         )
 
         if filename:
-            try:
-                success = self.fs.create_image(size, filename)
+            def on_created(success):
                 if success:
-                    self.fs_info_label.config(
-                        text=f"ФС: {os.path.basename(filename)} ({size} кластеров)")
                     self.update_path_display()
                     self.refresh_list()
                     self.update_status(f"Образ создан: {filename}")
                     messagebox.showinfo("Успех", "Образ файловой системы создан")
-            except Exception as e:
-                messagebox.showerror("Ошибка", f"Не удалось создать образ: {str(e)}")
+
+            self.run_async("Создание образа", self.fs.create_image, size, filename,
+                           cluster_size, on_done=on_created)
 
     def mount_fs(self):
         filename = filedialog.askopenfilename(
             title="Выберите образ файловой системы",
             filetypes=[("Файлы ФС", "*.fs"), ("Все файлы", "*.*")]
         )
-
-        if filename and self.fs.mount(filename):
-            self.fs_info_label.config(
-                text=f"ФС: {os.path.basename(filename)} ({self.fs.total_clusters} кластеров)")
-            self.update_path_display()
-            self.refresh_list()
-            self.update_status(f"ФС смонтирована: {filename}")
-        else:
-            messagebox.showerror("Ошибка", "Не удалось смонтировать файловую систему")
-
-    def refresh_list(self):
-        if not self.fs.filename:
+        if not filename:
             return
 
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-
-        try:
-            entries = self.fs.read_dir()
-
-            for entry in entries:
-                if entry['name'] in ('.', '..'):
-                    continue
-
-                item_type = "📁 Каталог" if entry['is_dir'] else "📄 Файл"
-                size = entry['size'] if not entry['is_dir'] else f"{entry['num_entries']} зап."
-                clusters_info = f"{entry['start_cluster']}-{entry['end_cluster']}"
-                status = "Занят"
+        def on_mounted(success):
+            if success:
+                self.update_path_display()
+                self.refresh_list()
+                self.update_status(f"ФС смонтирована: {filename}")
+            else:
+                messagebox.showerror("Ошибка", "Не удалось смонтировать файловую систему")
 
-                tags = ('directory',) if entry['is_dir'] else ('file',)
+        self.run_async("Монтирование", self.fs.mount, filename, on_done=on_mounted)
 
-                self.tree.insert('', END,
-                                 values=(entry['name'], item_type, size, clusters_info, status),
-                                 tags=tags)
+    def update_fs_info(self):
+        """Обновление информации об образе (свободное место без сканирования)"""
+        self.fs_info_label.config(
+            text=f"ФС: {os.path.basename(self.fs.filename)} "
+                 f"({self.fs.total_clusters} кластеров, свободно {self.fs.free_count})")
+        self.cluster_info_label.config(text=f"Размер кластера: {self.fs.cluster_size} байт")
 
-            self.tree.tag_configure('directory', foreground='#0066cc')
-            self.tree.tag_configure('file', foreground='#333333')
+    def refresh_list(self):
+        if not self.fs.filename:
+            return
 
+        # Каталог читается в очереди фоновых операций, чтобы не пересекаться с ними
+        def read_listing():
+            return self.fs.get_current_path(), self.fs.read_dir()
+
+        self.run_async(None, read_listing, on_done=self.fill_list)
+
+    @staticmethod
+    def row_values(entry):
+        """Значения строки списка для записи каталога"""
+        item_type = "📁 Каталог" if entry.is_dir else "📄 Файл"
+        size = entry.size if not entry.is_dir else f"{entry.num_entries} зап."
+        clusters_info = f"{entry.start_cluster}-{entry.end_cluster}"
+        return (entry.name, item_type, size, clusters_info, "Занят")
+
+    def fill_list(self, listing):
+        """Обновление списка файлов по прочитанному каталогу
+
+        Для того же каталога строки сравниваются с показанными: удаляются,
+        изменяются и добавляются только отличающиеся. Отображается столько
+        записей, сколько было показано (не меньше страницы), остальные
+        подгружаются при прокрутке.
+        """
+        path, entries = listing
+        self.update_fs_info()
+
+        if path != self.listing_path:
+            # Другой каталог - список строится заново с первой страницы
+            self.tree.delete(*self.rows)
+            self.rows = {}
+            self.listing_path = path
+            self.listing = entries
+            self.rendered = 0
+            self.render_more()
             self.update_status(f"Записей: {len(entries)}")
-        except Exception as e:
-            messagebox.showerror("Ошибка", f"Не удалось прочитать каталог: {str(e)}")
+            return
+
+        # Сравнение идет с сохраненными значениями строк, к Treeview
+        # обращаемся только за изменениями
+        target = entries[:max(self.rendered, PAGE_SIZE)]
+        wanted = {entry.name: self.row_values(entry) for entry in target}
+
+        gone = [name for name in self.rows if name not in wanted]
+        if gone:
+            self.tree.delete(*gone)
+            for name in gone:
+                del self.rows[name]
+
+        # Порядок записей каталога не меняется, новые встают на свои места
+        for index, entry in enumerate(target):
+            values = wanted[entry.name]
+            old = self.rows.get(entry.name)
+            if old == values:
+                continue
+            tags = ('directory',) if entry.is_dir else ('file',)
+            if old is None:
+                self.tree.insert('', index, iid=entry.name, values=values, tags=tags)
+            else:
+                self.tree.item(entry.name, values=values, tags=tags)
+            self.rows[entry.name] = values
+
+        self.listing = entries
+        self.rendered = len(target)
+        self.update_status(f"Записей: {len(entries)}")
+
+    def render_more(self):
+        """Добавление следующей страницы строк списка файлов"""
+        for entry in self.listing[self.rendered:self.rendered + PAGE_SIZE]:
+            values = self.row_values(entry)
+            self.tree.insert('', END, iid=entry.name, values=values,
+                             tags=('directory',) if entry.is_dir else ('file',))
+            self.rows[entry.name] = values
+        self.rendered = min(len(self.listing), self.rendered + PAGE_SIZE)
 
     def on_item_double_click(self, event):
         """Обработка двойного клика - переход в каталог"""
@@ -991,39 +560,36 @@ class FSGUI:
             return
 
         item = self.tree.item(selection[0])
-        name = item['values'][0]
+        name = selection[0]  # идентификатор строки - имя записи
 
         if "Каталог" in item['values'][1]:
-            success, message = self.fs.change_directory(name)
-            if success:
-                self.update_path_display()
-                self.refresh_list()
-                self.update_status(message)
-            else:
-                messagebox.showwarning("Внимание", message)
+            self.navigate(name)
         else:
             # Для файлов - предложить копирование
             self.copy_from_fs_gui()
 
-    def go_up(self):
-        """Переход на уровень выше"""
-        if self.fs.filename:
-            success, message = self.fs.change_directory("..")
+    def navigate(self, path, error_prefix=""):
+        """Смена текущего каталога в очереди фоновых операций"""
+        def on_changed(result):
+            success, message = result
+            self.update_path_display()
             if success:
-                self.update_path_display()
                 self.refresh_list()
                 self.update_status(message)
             else:
-                messagebox.showinfo("Информация", message)
+                messagebox.showwarning("Внимание", error_prefix + message)
+
+        self.run_async(None, self.fs.change_directory, path, on_done=on_changed)
+
+    def go_up(self):
+        """Переход на уровень выше"""
+        if self.fs.filename:
+            self.navigate("..")
 
     def go_root(self):
         """Переход в корневой каталог"""
         if self.fs.filename:
-            success, message = self.fs.change_directory("/")
-            if success:
-                self.update_path_display()
-                self.refresh_list()
-                self.update_status(message)
+            self.navigate("/")
 
     def change_directory(self):
         """Переход в каталог по пути"""
@@ -1035,25 +601,15 @@ class FSGUI:
         if not path:
             return
 
-        # Простой парсинг пути
-        if path.startswith("/"):
-            # Абсолютный путь - сначала идем в корень
-            self.fs.change_directory("/")
-            path = path[1:]
+        self.navigate(path, f"Не удалось перейти в {path}: ")
 
-        # Разбиваем путь на компоненты
-        components = [c for c in path.split("/") if c]
+    def listing_item(self, name):
+        """Абсолютный путь элемента показанного каталога
 
-        for component in components:
-            success, message = self.fs.change_directory(component)
-            if not success:
-                messagebox.showerror("Ошибка", f"Не удалось перейти в {component}: {message}")
-                self.update_path_display()
-                return
-
-        self.update_path_display()
-        self.refresh_list()
-        self.update_status(f"Переход в {path}")
+        Операции выполняются в очереди, и поставленный раньше переход мог
+        сменить текущий каталог ФС, поэтому передается полный путь.
+        """
+        return posixpath.join(self.listing_path or "/", name)
 
     def copy_to_fs_gui(self):
         if not self.fs.filename:
@@ -1069,15 +625,95 @@ class FSGUI:
                                            initialvalue=os.path.basename(src_file))
 
         if dest_name:
-            self.update_status("Копирование...")
-            success, message = self.fs.copy_to_fs(src_file, dest_name)
+            self.run_async("Копирование", self.fs.copy_to_fs, src_file,
+                           self.listing_item(dest_name),
+                           on_done=self.show_result, with_progress=True)
+
+    def import_tree_gui(self):
+        """Рекурсивный импорт каталога хоста в текущий каталог"""
+        if not self.fs.filename:
+            messagebox.showwarning("Внимание", "Сначала смонтируйте файловую систему")
+            return
+
+        src_dir = filedialog.askdirectory(title="Выберите каталог для импорта в ФС")
+        if not src_dir:
+            return
+
+        dest_name = simpledialog.askstring("Импорт каталога",
+                                           "Введите имя каталога в файловой системе:",
+                                           initialvalue=os.path.basename(src_dir))
+
+        if dest_name:
+            self.run_async("Импорт", self.fs.import_tree, src_dir, self.listing_item(dest_name),
+                           on_done=self.show_result, with_progress=True)
+
+    def export_tree_gui(self):
+        """Рекурсивный экспорт выбранного (или текущего) каталога на хост"""
+        if not self.fs.filename:
+            messagebox.showwarning("Внимание", "Сначала смонтируйте файловую систему")
+            return
+
+        src_path = self.listing_path
+        selection = self.tree.selection()
+        if selection:
+            item = self.tree.item(selection[0])
+            if "Каталог" in item['values'][1]:
+                src_path = self.listing_item(selection[0])
+
+        dest_dir = filedialog.askdirectory(title="Куда экспортировать каталог")
+        if not dest_dir:
+            return
+
+        dest_dir = os.path.join(dest_dir, posixpath.basename(src_path) or "root")
+        self.run_async("Экспорт", self.fs.export_tree, src_path, dest_dir,
+                       on_done=functools.partial(self.show_result, refresh=False),
+                       with_progress=True)
+
+    def defragment_gui(self):
+        """Уплотнение образа с отчетом о фрагментации"""
+        if not self.fs.filename:
+            messagebox.showwarning("Внимание", "Сначала смонтируйте файловую систему")
+            return
+
+        def on_measured(fragmentation):
+            count, largest = fragmentation
+            if not messagebox.askyesno("Дефрагментация",
+                                       f"Свободных участков: {count}, наибольший: {largest} кластеров.\n"
+                                       f"Выполнить дефрагментацию?"):
+                return
+
+            # Прерывание переноса участков повредило бы образ - отмена только до начала
+            self.run_async("Дефрагментация", self.fs.defragment, on_done=self.show_result,
+                           with_progress=True, cancellable=False)
+
+        # Оценка тоже идет в очереди фоновых операций: ФС не потокобезопасна
+        self.run_async(None, self.fs.fragmentation, on_done=on_measured)
+
+    def check_gui(self):
+        """Проверка целостности образа с предложением исправить ошибки"""
+        if not self.fs.filename:
+            messagebox.showwarning("Внимание", "Сначала смонтируйте файловую систему")
+            return
+
+        def on_repaired(result):
+            success, message = result
             if success:
-                messagebox.showinfo("Успех", message)
-                self.refresh_list()
+                messagebox.showinfo("Проверка ФС", message)
             else:
-                messagebox.showerror("Ошибка", message)
+                messagebox.showerror("Проверка ФС", message)
+            self.refresh_list()
+
+        def on_checked(result):
+            success, message = result
+            if success:
+                messagebox.showinfo("Проверка ФС", message)
+            elif messagebox.askyesno("Проверка ФС", message + "\n\nИсправить ошибки?"):
+                self.run_async("Исправление", self.fs.check, repair=True, on_done=on_repaired)
+                return
             self.update_status("Готов")
 
+        self.run_async("Проверка", self.fs.check, on_done=on_checked)
+
     def copy_from_fs_gui(self):
         if not self.fs.filename:
             messagebox.showwarning("Внимание", "Сначала смонтируйте файловую систему")
@@ -1089,7 +725,7 @@ class FSGUI:
             return
 
         item = self.tree.item(selection[0])
-        filename = item['values'][0]
+        filename = selection[0]
 
         if "Каталог" in item['values'][1]:
             messagebox.showwarning("Внимание", "Нельзя скопировать каталог")
@@ -1101,14 +737,10 @@ class FSGUI:
         )
 
         if dest_path:
-            self.update_status("Копирование...")
-            success, message = self.fs.copy_from_fs(filename, dest_path)
-            if success:
-                messagebox.showinfo("Успех", message)
-                self.update_status(f"Файл скопирован: {dest_path}")
-            else:
-                messagebox.showerror("Ошибка", message)
-            self.update_status("Готов")
+            self.run_async("Копирование", self.fs.copy_from_fs, self.listing_item(filename),
+                           dest_path,
+                           on_done=functools.partial(self.show_result, refresh=False),
+                           with_progress=True)
 
     def delete_file_gui(self):
         if not self.fs.filename:
@@ -1121,7 +753,7 @@ class FSGUI:
             return
 
         item = self.tree.item(selection[0])
-        filename = item['values'][0]
+        filename = selection[0]
 
         if "Каталог" in item['values'][1]:
             messagebox.showwarning("Внимание", "Для удаления каталога используйте 'Удалить каталог'")
@@ -1129,14 +761,9 @@ class FSGUI:
 
         if messagebox.askyesno("Подтверждение",
                                f"Удалить файл '{filename}'?"):
-            self.update_status("Удаление...")
-            success, message = self.fs.delete_item(filename, is_dir=False)
-            if success:
-                messagebox.showinfo("Успех", message)
-                self.refresh_list()
-            else:
-                messagebox.showerror("Ошибка", message)
-            self.update_status("Готов")
+            self.run_async("Удаление", self.fs.delete_item, self.listing_item(filename),
+                           is_dir=False,
+                           on_done=self.show_result)
 
     def delete_directory_gui(self):
         if not self.fs.filename:
@@ -1149,7 +776,7 @@ class FSGUI:
             return
 
         item = self.tree.item(selection[0])
-        dirname = item['values'][0]
+        dirname = selection[0]
 
         if "Каталог" not in item['values'][1]:
             messagebox.showwarning("Внимание", "Выбранный элемент не является каталогом")
@@ -1158,14 +785,9 @@ class FSGUI:
         if messagebox.askyesno("Подтверждение",
                                f"Удалить каталог '{dirname}' со всем содержимым?\n"
                                "Это действие нельзя отменить!"):
-            self.update_status("Удаление каталога...")
-            success, message = self.fs.delete_item(dirname, is_dir=True)
-            if success:
-                messagebox.showinfo("Успех", message)
-                self.refresh_list()
-            else:
-                messagebox.showerror("Ошибка", message)
-            self.update_status("Готов")
+            self.run_async("Удаление каталога", self.fs.delete_item,
+                           self.listing_item(dirname), is_dir=True,
+                           on_done=self.show_result)
 
     def rename_gui(self):
         if not self.fs.filename:
@@ -1178,19 +800,16 @@ class FSGUI:
             return
 
         item = self.tree.item(selection[0])
-        old_name = item['values'][0]
+        old_name = selection[0]
 
         new_name = simpledialog.askstring("Переименование",
                                           f"Введите новое имя для '{old_name}':",
                                           initialvalue=old_name)
 
         if new_name and new_name != old_name:
-            success, message = self.fs.rename_item(old_name, new_name)
-            if success:
-                messagebox.showinfo("Успех", message)
-                self.refresh_list()
-            else:
-                messagebox.showerror("Ошибка", message)
+            self.run_async("Переименование", self.fs.rename_item,
+                           self.listing_item(old_name), new_name,
+                           on_done=self.show_result)
 
     def create_directory(self):
         if not self.fs.filename:
@@ -1201,14 +820,9 @@ class FSGUI:
                                           "Введите имя нового каталога:")
 
         if dir_name:
-            self.update_status("Создание каталога...")
-            success, message = self.fs.create_directory(dir_name)
-            if success:
-                messagebox.showinfo("Успех", message)
-                self.refresh_list()
-            else:
-                messagebox.showerror("Ошибка", message)
-            self.update_status("Готов")
+            self.run_async("Создание каталога", self.fs.create_directory,
+                           self.listing_item(dir_name),
+                           on_done=self.show_result)
 
     def move_item_gui(self):
         """Перемещение файла в другой каталог"""
@@ -1222,43 +836,18 @@ class FSGUI:
             return
 
         item = self.tree.item(selection[0])
-        item_name = item['values'][0]
+        item_name = selection[0]
         is_dir = "Каталог" in item['values'][1]
 
         # Запрос целевого каталога
         target_dir = simpledialog.askstring("Перемещение",
                                             f"Введите путь целевого каталога для '{item_name}':\n"
                                             "(используйте '/' для корня, '..' для родителя)",
-                                            initialvalue=self.fs.get_current_path())
+                                            initialvalue=self.listing_path)
 
         if not target_dir:
             return
 
-        # Сохраняем текущий каталог
-        current_cluster = self.fs.current_dir_cluster
-
-        # Переходим в целевой каталог
-        if target_dir != self.fs.get_current_path():
-            if target_dir.startswith("/"):
-                self.fs.change_directory("/")
-                target_dir = target_dir[1:]
-
-            components = [c for c in target_dir.split("/") if c]
-
-            for component in components:
-                success, message = self.fs.change_directory(component)
-                if not success:
-                    messagebox.showerror("Ошибка", f"Не удалось перейти в {component}: {message}")
-                    self.fs.current_dir_cluster = current_cluster
-                    self.update_path_display()
-                    return
-
-        target_cluster = self.fs.current_dir_cluster
-
-        # Возвращаемся в исходный каталог
-        self.fs.current_dir_cluster = current_cluster
-        self.update_path_display()
-
         # Запрос нового имени (опционально)
         new_name = simpledialog.askstring("Перемещение",
                                           f"Введите новое имя для '{item_name}' (оставьте пустым для сохранения):",
@@ -1267,17 +856,11 @@ class FSGUI:
         if new_name == "":
             new_name = item_name
 
-        # Выполняем перемещение
-        self.update_status("Перемещение...")
-        success, message = self.fs.move_item(item_name, target_cluster, new_name)
-
-        if success:
-            messagebox.showinfo("Успех", message)
-            self.refresh_list()
-        else:
-            messagebox.showerror("Ошибка", message)
-
-        self.update_status("Готов")
+        # Выполняем перемещение (отсутствие целевого каталога проверит move_item);
+        # относительный путь цели - от показанного каталога
+        self.run_async("Перемещение", self.fs.move_item, self.listing_item(item_name),
+                       posixpath.normpath(self.listing_item(target_dir)), new_name,
+                       on_done=self.show_result)
 
     def move_directory_gui(self):
         """Перемещение каталога"""
@@ -0,0 +1,196 @@
+import sys
+import shlex
+import argparse
+import posixpath
+
+from simplefs import SimpleFS, DEFAULT_CLUSTER_SIZE
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="SimpleFS image manager")
+    parser.add_argument("image", help="файл образа")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    # mkfs
+    mkfs_p = sub.add_parser("mkfs", help="создать образ")
+    mkfs_p.add_argument("clusters", type=int)
+    mkfs_p.add_argument("-c", "--cluster-size", type=int, default=DEFAULT_CLUSTER_SIZE)
+    mkfs_p.add_argument("--preallocate", action="store_true",
+                        help="сразу зарезервировать место под весь образ")
+
+    # ls
+    ls_p = sub.add_parser("ls", help="содержимое каталога")
+    ls_p.add_argument("path", nargs="?", default="/")
+
+    # put
+    put_p = sub.add_parser("put", help="скопировать файл в образ")
+    put_p.add_argument("src")
+    put_p.add_argument("dest")
+
+    # get
+    get_p = sub.add_parser("get", help="скопировать файл из образа")
+    get_p.add_argument("src")
+    get_p.add_argument("dest")
+
+    # rm
+    rm_p = sub.add_parser("rm", help="удалить файл или каталог")
+    rm_p.add_argument("path")
+    rm_p.add_argument("-r", "--recursive", action="store_true")
+
+    # mv
+    mv_p = sub.add_parser("mv", help="переместить или переименовать")
+    mv_p.add_argument("src")
+    mv_p.add_argument("dest")
+
+    # mkdir
+    mkdir_p = sub.add_parser("mkdir", help="создать каталог")
+    mkdir_p.add_argument("path")
+
+    # stat
+    stat_p = sub.add_parser("stat", help="сведения об элементе")
+    stat_p.add_argument("path")
+
+    # df
+    sub.add_parser("df", help="свободное место и фрагментация")
+
+    # import / export
+    imp_p = sub.add_parser("import", help="импортировать каталог хоста")
+    imp_p.add_argument("src")
+    imp_p.add_argument("dest")
+    exp_p = sub.add_parser("export", help="экспортировать каталог на хост")
+    exp_p.add_argument("src")
+    exp_p.add_argument("dest")
+
+    # fsck / defrag
+    fsck_p = sub.add_parser("fsck", help="проверить образ")
+    fsck_p.add_argument("--repair", action="store_true")
+    sub.add_parser("defrag", help="дефрагментировать образ")
+
+    # batch
+    sub.add_parser("batch", help="выполнить команды из stdin за одно монтирование")
+
+    return parser
+
+
+def run(fs, args):
+    """Выполнение одной команды над смонтированным образом: (успех, вывод)"""
+    if args.cmd == "ls":
+        try:
+            entries = fs.read_dir(args.path)
+        except FileNotFoundError as e:
+            return False, str(e)
+        lines = []
+        for entry in sorted(entries, key=lambda e: e.name):
+            kind = "d" if entry.is_dir else "-"
+            size = entry.num_entries if entry.is_dir else entry.size
+            lines.append(f"{kind} {size:>10} {entry.name}")
+        return True, "\n".join(lines)
+
+    elif args.cmd == "put":
+        return fs.copy_to_fs(args.src, args.dest)
+
+    elif args.cmd == "get":
+        return fs.copy_from_fs(args.src, args.dest)
+
+    elif args.cmd == "rm":
+        entry = fs.resolve(args.path)
+        if entry is None:
+            return False, "Элемент не найден"
+        if entry.is_dir and not args.recursive:
+            return False, "Это каталог, используйте -r"
+        return fs.delete_item(args.path, entry.is_dir)
+
+    elif args.cmd == "mv":
+        # Существующий каталог - цель перемещения, иначе - новый путь элемента
+        target = fs.resolve(args.dest)
+        if target is not None and target.is_dir:
+            return fs.move_item(args.src, args.dest)
+        dest_dir, dest_name = posixpath.split(posixpath.normpath(posixpath.join('/', args.dest)))
+        return fs.move_item(args.src, dest_dir, dest_name)
+
+    elif args.cmd == "mkdir":
+        return fs.create_directory(args.path)
+
+    elif args.cmd == "stat":
+        entry = fs.resolve(args.path)
+        if entry is None:
+            return False, "Элемент не найден"
+        lines = [f"Имя: {entry.name}",
+                 f"Тип: {'каталог' if entry.is_dir else 'файл'}",
+                 f"Размер: {entry.size}",
+                 f"Кластеры: {entry.start_cluster}-{entry.end_cluster}"]
+        if entry.is_dir:
+            lines.append(f"Записей: {entry.num_entries}")
+        return True, "\n".join(lines)
+
+    elif args.cmd == "df":
+        count, largest = fs.fragmentation()
+        return True, (f"Кластеров: {fs.total_clusters}, свободно: {fs.free_count} "
+                      f"({fs.free_space()} байт), размер кластера: {fs.cluster_size}\n"
+                      f"Свободных участков: {count}, наибольший: {largest}")
+
+    elif args.cmd == "import":
+        return fs.import_tree(args.src, args.dest)
+
+    elif args.cmd == "export":
+        return fs.export_tree(args.src, args.dest)
+
+    elif args.cmd == "fsck":
+        return fs.check(repair=args.repair)
+
+    elif args.cmd == "defrag":
+        return fs.defragment()
+
+    return False, f"Команда недоступна: {args.cmd}"
+
+
+def report(success, output):
+    if output:
+        print(output, file=sys.stdout if success else sys.stderr)
+    return success
+
+
+def run_batch(fs, parser):
+    """Команды из stdin по одной на строку (без имени образа), одно монтирование"""
+    ok = True
+    for line in sys.stdin:
+        argv = shlex.split(line, comments=True)
+        if not argv:
+            continue
+        try:
+            args = parser.parse_args([fs.filename] + argv)
+        except SystemExit:
+            ok = False
+            continue
+        if args.cmd in ("mkfs", "batch"):
+            ok = report(False, f"Команда недоступна в пакетном режиме: {args.cmd}") and ok
+            continue
+        ok = report(*run(fs, args)) and ok
+    return ok
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    fs = SimpleFS()
+
+    if args.cmd == "mkfs":
+        try:
+            fs.create_image(args.clusters, args.image, args.cluster_size, args.preallocate)
+        except ValueError as e:
+            return report(False, str(e))
+        fs.unmount()
+        return report(True, f"Образ создан: {args.image}")
+
+    if not fs.mount(args.image):
+        return report(False, f"Не удалось смонтировать образ: {args.image}")
+    try:
+        if args.cmd == "batch":
+            return run_batch(fs, parser)
+        return report(*run(fs, args))
+    finally:
+        fs.unmount()
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,435 @@
+import os
+import sys
+import stat
+import socket
+import signal
+import struct
+import asyncio
+import argparse
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+
+from simplefs import SimpleFS, DirEntry, CHUNK_SIZE
+
+
+# ==================== ПРОТОКОЛ ====================
+
+# Запрос: код операции, флаги, длина пути, длина данных; за ним путь
+# (UTF-8) и, для записи, данные файла
+REQUEST = struct.Struct('<BBHQ')
+# Ответ: статус, длина тела; за ним тело - сообщение (UTF-8), записи
+# каталога или данные файла
+RESPONSE = struct.Struct('<BQ')
+# Запись каталога в ответе: тип, имя, размер, первый и последний кластер,
+# число записей (для каталога)
+ENTRY = struct.Struct('<B16sQIII')
+
+OP_LIST = 1
+OP_STAT = 2
+OP_READ = 3
+OP_WRITE = 4
+OP_MKDIR = 5
+OP_DELETE = 6
+
+FLAG_RECURSIVE = 1  # удаление каталога вместе с содержимым
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+UPLOAD_TIMEOUT = 30  # секунд ожидания очередной порции данных загрузки
+UPLOAD_MIN_RATE = 64 * 1024  # байт/с: общий срок загрузки - UPLOAD_TIMEOUT + размер / скорость
+
+
+def pack_entry(entry):
+    """Упаковка записи каталога для ответа"""
+    return ENTRY.pack(1 if entry.is_dir else 0, entry.name.encode('ascii'), entry.size,
+                      entry.start_cluster, entry.end_cluster, entry.num_entries)
+
+
+def unpack_entry(buf, offset=0):
+    """Разбор записи каталога из ответа"""
+    kind, name, size, start_cluster, end_cluster, num_entries = ENTRY.unpack_from(buf, offset)
+    return DirEntry(name.rstrip(b'\0').decode('ascii'), kind == 1, size,
+                    start_cluster, end_cluster, num_entries)
+
+
+def normalize(path):
+    """Абсолютный путь в ФС: у сервера нет текущего каталога клиента"""
+    return posixpath.normpath('/' + path.lstrip('/'))
+
+
+def extent(entry):
+    """Участок файла по записи каталога (None - файла нет): совпадение
+    участков значит, что файл не удаляли, не переносили и не меняли в размере"""
+    if entry is None:
+        return None
+    return entry.is_dir, entry.start_cluster, entry.size
+
+
+# ==================== СЕРВЕР ====================
+
+class SFSServer:
+    """Сервер образа: один смонтированный SimpleFS на всех клиентов
+
+    Соединения обслуживает asyncio, а вызовы SimpleFS выполняются по
+    очереди в одном рабочем потоке: объект ФС не потокобезопасен, зато его
+    кэши каталогов и путей остаются теплыми между запросами. Данные файлов
+    передаются блоками CHUNK_SIZE и целиком в памяти не держатся; сокет
+    читается и пишется только в asyncio-потоке, и рабочий поток не ждет
+    медленных клиентов.
+    """
+
+    def __init__(self, fs):
+        self.fs = fs
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.uploads = set()  # пути файлов, данные которых еще принимаются
+
+    async def call(self, func, *args):
+        """Вызов SimpleFS в рабочем потоке"""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    @staticmethod
+    def reply(writer, success, body=b''):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        writer.write(RESPONSE.pack(STATUS_OK if success else STATUS_ERROR, len(body)))
+        writer.write(body)
+
+    @staticmethod
+    async def skip(reader, length):
+        """Пропуск length байт данных запроса"""
+        while length:
+            length -= len(await reader.readexactly(min(CHUNK_SIZE, length)))
+
+    async def handle(self, reader, writer):
+        """Обслуживание одного клиента: запросы выполняются по порядку"""
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(REQUEST.size)
+                except asyncio.IncompleteReadError:
+                    break  # клиент закрыл соединение
+                op, flags, path_len, length = REQUEST.unpack(header)
+                path = normalize((await reader.readexactly(path_len)).decode('utf-8', 'replace'))
+
+                if op == OP_WRITE:
+                    await self.write_file(reader, writer, path, length)
+                else:
+                    # Данные нужны только записи
+                    await self.skip(reader, length)
+                    if op == OP_READ and path in self.uploads:
+                        self.reply(writer, False, "Файл еще загружается")
+                    elif op == OP_READ:
+                        await self.read_file(writer, path)
+                    else:
+                        self.reply(writer, *await self.call(self.execute, op, path, flags))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def execute(self, op, path, flags):
+        """Операции без потока данных (в рабочем потоке): (успех, тело ответа)"""
+        fs = self.fs
+        try:
+            if op == OP_LIST:
+                return True, b''.join(pack_entry(entry) for entry in fs.read_dir(path))
+
+            if op == OP_STAT:
+                entry = fs.resolve(path)
+                if entry is None:
+                    return False, "Элемент не найден"
+                return True, pack_entry(entry)
+
+            if op == OP_MKDIR:
+                return fs.create_directory(path)
+
+            if op == OP_DELETE:
+                entry = fs.resolve(path)
+                if entry is None:
+                    return False, "Элемент не найден"
+                if entry.is_dir and not flags & FLAG_RECURSIVE:
+                    return False, "Это каталог, нужно рекурсивное удаление"
+                return fs.delete_item(path, entry.is_dir)
+        except OSError as e:
+            return False, str(e)
+
+        return False, f"Неизвестная операция: {op}"
+
+    async def read_file(self, writer, path):
+        """Отправка файла блоками; следующий блок читается после drain()
+
+        Перед каждым блоком сверяется поколение метаданных: если файл за
+        время передачи удалили, перенесли или изменили в размере, участок
+        мог достаться другим данным, и передача обрывается закрытием
+        соединения (длина уже отправлена в заголовке ответа).
+        """
+        try:
+            raw, entry, generation = await self.call(self.open_file, path)
+        except OSError as e:
+            self.reply(writer, False, str(e))
+            return
+
+        with raw:
+            remaining = entry.size
+            writer.write(RESPONSE.pack(STATUS_OK, remaining))
+            while remaining:
+                generation, chunk = await self.call(self.read_chunk, path, raw, entry,
+                                                    generation, min(CHUNK_SIZE, remaining))
+                if chunk is None:
+                    raise ConnectionError("Файл изменен во время передачи")
+                writer.write(chunk)
+                remaining -= len(chunk)
+                await writer.drain()
+
+    def open_file(self, path):
+        """Открытие файла на чтение (в рабочем потоке): (файл, запись, поколение)"""
+        fs = self.fs
+        with fs.lock():
+            raw = fs.open(path, 'rb', 0)
+            return raw, fs.resolve(path), fs.generation()
+
+    def read_chunk(self, path, raw, entry, generation, size):
+        """Блок файла (в рабочем потоке): (поколение, данные или None,
+        если файл изменился после открытия)"""
+        fs = self.fs
+        with fs.lock():
+            if fs.generation() != generation:
+                if extent(fs.resolve(path)) != extent(entry):
+                    return generation, None
+                generation = fs.generation()
+            return generation, raw.read(size)
+
+    async def write_file(self, reader, writer, path, length):
+        """Прием файла
+
+        Запись и участок файла выделяются одним вызовом, без обнуления.
+        Данные читаются из сокета в asyncio-потоке, и в рабочий поток уходят
+        только полученные блоки - записи без сброса на диск; завершает
+        прием один sync(). Между блоками рабочий поток обслуживает других
+        клиентов. Если соединение оборвалось или загрузка не уложилась в
+        срок, выделенный файл удаляется.
+        """
+        if path in self.uploads:
+            await self.skip(reader, length)
+            self.reply(writer, False, "Файл уже загружается")
+            return
+        success, entry = await self.call(self.reserve, path, length)
+        if not success:
+            await self.skip(reader, length)
+            self.reply(writer, False, entry)
+            return
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + UPLOAD_TIMEOUT + length / UPLOAD_MIN_RATE
+        self.uploads.add(path)
+        try:
+            offset = 0
+            while offset < length:
+                size = min(CHUNK_SIZE, length - offset)
+                timeout = min(UPLOAD_TIMEOUT, deadline - loop.time())
+                try:
+                    chunk = await asyncio.wait_for(reader.readexactly(size), max(timeout, 0))
+                except asyncio.TimeoutError:
+                    raise ConnectionError("Превышено время загрузки") from None
+                success, message = await self.call(self.write_chunk, path, entry, offset, chunk)
+                offset += size
+                if not success:
+                    # Файл удалили или изменили другим путем - он уже не наш
+                    await self.skip(reader, length - offset)
+                    self.reply(writer, False, message)
+                    return
+            await self.call(self.fs.sync)
+        except BaseException:
+            # Не await: при отмене задачи (остановка сервера) удаление все
+            # равно выполнится - рабочий поток завершает очередь
+            self.executor.submit(self.discard, path, entry)
+            raise
+        finally:
+            self.uploads.discard(path)
+        self.reply(writer, True, f"Записано байт: {length}")
+
+    def reserve(self, path, length):
+        """Создание файла под загрузку (в рабочем потоке): (успех, запись
+        файла или сообщение об ошибке)"""
+        fs = self.fs
+        # Сброс на диск - один, после приема данных
+        with fs.transaction(sync=False):
+            success, message = fs.create_file(path, length, fill=False)
+            if not success:
+                return False, message
+            return True, fs.resolve(path)
+
+    def write_chunk(self, path, entry, offset, chunk):
+        """Запись блока загрузки без сброса на диск (в рабочем потоке)"""
+        fs = self.fs
+        with fs.lock(exclusive=True):
+            if extent(fs.resolve(path)) != extent(entry):
+                return False, "Файл изменен во время загрузки"
+            return fs.write_at(path, offset, chunk, sync=False)
+
+    def discard(self, path, entry):
+        """Удаление недогруженного файла, если его не заменили (в рабочем потоке)"""
+        fs = self.fs
+        with fs.transaction():
+            if extent(fs.resolve(path)) == extent(entry):
+                fs.delete_item(path)
+
+
+async def serve(server, socket_path):
+    """Прием соединений до SIGINT/SIGTERM"""
+    # Оставшийся от прошлого запуска сокет удаляется, другие файлы - нет
+    try:
+        if stat.S_ISSOCK(os.stat(socket_path).st_mode):
+            os.unlink(socket_path)
+    except FileNotFoundError:
+        pass
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+
+    listener = await asyncio.start_unix_server(server.handle, path=socket_path,
+                                               limit=CHUNK_SIZE)
+    try:
+        async with listener:
+            await stop.wait()
+    finally:
+        os.unlink(socket_path)
+
+
+# ==================== КЛИЕНТ ====================
+
+class SFSClient:
+    """Синхронный клиент сервера образа: with SFSClient(socket_path) as c: ...
+
+    Методы возвращают (успех, результат или сообщение об ошибке), как и
+    методы SimpleFS. Одно соединение обслуживает любое число запросов.
+    """
+
+    def __init__(self, socket_path):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(socket_path)
+        self.file = self.sock.makefile('rwb')
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _request(self, op, path, length=0, flags=0):
+        path = path.encode('utf-8')
+        self.file.write(REQUEST.pack(op, flags, len(path), length))
+        self.file.write(path)
+
+    def _read_exact(self, size):
+        data = self.file.read(size)
+        if len(data) < size:
+            raise ConnectionError("Сервер закрыл соединение")
+        return data
+
+    def _response(self):
+        """Заголовок ответа: (успех, длина тела)"""
+        self.file.flush()
+        status, length = RESPONSE.unpack(self._read_exact(RESPONSE.size))
+        return status == STATUS_OK, length
+
+    def _call(self, op, path, flags=0):
+        """Запрос без данных: (успех, тело ответа)"""
+        self._request(op, path, flags=flags)
+        success, length = self._response()
+        return success, self._read_exact(length)
+
+    def _message(self):
+        """Ответ-сообщение: (успех, текст)"""
+        success, length = self._response()
+        return success, self._read_exact(length).decode('utf-8')
+
+    def list(self, path='/'):
+        """Содержимое каталога: (True, [DirEntry, ...])"""
+        success, body = self._call(OP_LIST, path)
+        if not success:
+            return False, body.decode('utf-8')
+        return True, [unpack_entry(body, offset) for offset in range(0, len(body), ENTRY.size)]
+
+    def stat(self, path):
+        """Запись элемента: (True, DirEntry)"""
+        success, body = self._call(OP_STAT, path)
+        if not success:
+            return False, body.decode('utf-8')
+        return True, unpack_entry(body)
+
+    def mkdir(self, path):
+        self._request(OP_MKDIR, path)
+        return self._message()
+
+    def delete(self, path, recursive=False):
+        self._request(OP_DELETE, path, flags=FLAG_RECURSIVE if recursive else 0)
+        return self._message()
+
+    def read(self, path, dst):
+        """Чтение файла ФС в открытый двоичный файл dst блоками CHUNK_SIZE"""
+        self._request(OP_READ, path)
+        success, remaining = self._response()
+        if not success:
+            return False, self._read_exact(remaining).decode('utf-8')
+        size = remaining
+        while remaining:
+            chunk = self._read_exact(min(CHUNK_SIZE, remaining))
+            dst.write(chunk)
+            remaining -= len(chunk)
+        return True, f"Прочитано байт: {size}"
+
+    def write(self, path, src, size=None):
+        """Создание файла ФС из открытого двоичного файла src
+
+        size по умолчанию - размер src (fstat); передается ровно size байт.
+        """
+        if size is None:
+            size = os.fstat(src.fileno()).st_size
+        self._request(OP_WRITE, path, size)
+        remaining = size
+        while remaining:
+            chunk = src.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                # Поток запросов рассинхронизирован - соединение закрывается
+                self.close()
+                raise EOFError("Исходный файл короче заявленного размера")
+            self.file.write(chunk)
+            remaining -= len(chunk)
+        return self._message()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="SimpleFS image server")
+    parser.add_argument("image", help="файл образа")
+    parser.add_argument("socket", help="путь Unix-сокета")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    fs = SimpleFS()
+    if not fs.mount(args.image):
+        print(f"Не удалось смонтировать образ: {args.image}", file=sys.stderr)
+        return False
+
+    server = SFSServer(fs)
+    try:
+        asyncio.run(serve(server, args.socket))
+    finally:
+        # Сначала завершаются операции рабочего потока, затем образ закрывается
+        server.executor.shutdown(wait=True)
+        fs.unmount()
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
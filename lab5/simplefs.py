@@ -0,0 +1,2414 @@
+import io
+import os
+import re
+import mmap
+import heapq
+import bisect
+import struct
+import posixpath
+import functools
+import contextlib
+import time
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировки образа между процессами недоступны
+    fcntl = None
+
+
+# ==================== ФАЙЛОВАЯ СИСТЕМА ====================
+
+# Заголовок образа: сигнатура, версия, резерв, размер кластера,
+# размер ФС в кластерах, размер битовой карты в байтах, кластер корня
+FS_HEADER = struct.Struct('<4sHHIIII')
+FS_MAGIC = b'SFS2'
+FS_VERSION = 3  # 3: каталоги - цепочки блоков
+HEADER_SIZE = 32  # заголовок с запасом под новые поля; за ним битовая карта
+
+# Счетчик поколений сразу за заголовком: увеличивается каждой записью
+# метаданных, по нему другие процессы узнают об устаревании своих кэшей.
+# В образах без счетчика здесь нули (поколение 0).
+FS_GENERATION = struct.Struct('<Q')
+GENERATION_OFFSET = FS_HEADER.size
+
+MIN_CLUSTER_SIZE = 512
+MAX_CLUSTER_SIZE = 64 * 1024
+DEFAULT_CLUSTER_SIZE = 4096
+MAX_FILE_SIZE = 0xFFFFFFFF  # длина файла хранится в 32-битном поле записи
+
+CHUNK_SIZE = 1024 * 1024
+PATH_CACHE_SIZE = 1024  # число запоминаемых путей каталогов
+IO_WORKERS = 8  # потоков для массового импорта/экспорта
+
+# Запись каталога: занята, тип, имя, первый кластер, последний кластер,
+# счетчик (число записей для каталога, длина в байтах для файла)
+DIR_ENTRY = struct.Struct('<BB16sIII')
+
+# Каталог - цепочка блоков. Первый блок занимает один кластер, каждый
+# следующий - столько же кластеров, сколько вся цепочка до него (но не
+# больше DIR_MAX_BLOCK_BYTES). Последний слот каждого блока зарезервирован
+# под ссылку на следующий блок (запись типа ENTRY_LINK).
+ENTRY_LINK = 2
+DIR_MAX_BLOCK_BYTES = 128 * 1024
+
+def _report_progress(progress, done, total, started):
+    """Передача хода операции: байт обработано, всего, скорость (байт/с)"""
+    if progress is None:
+        return
+    elapsed = time.monotonic() - started
+    progress(done, total, done / elapsed if elapsed > 0 else 0.0)
+
+
+def _merge_ranges(ranges):
+    """Объединение пересекающихся и соседних диапазонов [lo, hi) по возрастанию"""
+    ranges = sorted(ranges)
+    lo, hi = ranges[0]
+    for next_lo, next_hi in ranges[1:]:
+        if next_lo <= hi:
+            hi = max(hi, next_hi)
+            continue
+        yield lo, hi
+        lo, hi = next_lo, next_hi
+    yield lo, hi
+
+
+def _set_bits(bitmap, start, count, free):
+    """Установка битов [start, start + count) битовой карты (1 - свободен)
+
+    Целые байты заполняются одним срезом, маски применяются только к
+    крайним. Возвращает измененный диапазон байт [lo, hi).
+    """
+    end = start + count
+    lo_byte, lo_bit = divmod(start, 8)
+    hi_byte, hi_bit = divmod(end, 8)
+
+    def apply(byte_idx, mask):
+        if free:
+            bitmap[byte_idx] |= mask
+        else:
+            bitmap[byte_idx] &= ~mask & 0xFF
+
+    if lo_byte == hi_byte:
+        apply(lo_byte, ((1 << hi_bit) - 1) & ~((1 << lo_bit) - 1))
+    else:
+        apply(lo_byte, 0xFF & ~((1 << lo_bit) - 1))
+        fill = b'\xff' if free else b'\x00'
+        bitmap[lo_byte + 1:hi_byte] = fill * (hi_byte - lo_byte - 1)
+        if hi_bit:
+            apply(hi_byte, (1 << hi_bit) - 1)
+
+    return lo_byte, hi_byte + 1 if hi_bit else hi_byte
+
+
+def _kernel_copy(src_fd, offset, dst_fd, count, progress=None):
+    """Копирование участка файла в другой файл средствами ядра
+
+    Пробует os.copy_file_range, затем os.sendfile; данные не проходят
+    через память интерпретатора. Запись идет с текущей позиции dst_fd.
+    Возвращает число скопированных байт - если ни один способ не доступен
+    (другая ОС, неподдерживаемая ФС), остаток копирует вызывающий.
+    """
+    started = time.monotonic()
+    done = 0
+
+    methods = []
+    if hasattr(os, 'copy_file_range'):
+        methods.append(lambda pos, n: os.copy_file_range(src_fd, dst_fd, n, pos))
+    if hasattr(os, 'sendfile'):
+        methods.append(lambda pos, n: os.sendfile(dst_fd, src_fd, pos, n))
+
+    for method in methods:
+        try:
+            while done < count:
+                n = method(offset + done, min(CHUNK_SIZE, count - done))
+                if not n:
+                    break
+                done += n
+                _report_progress(progress, done, count, started)
+        except OSError:
+            continue
+        if done == count:
+            break
+
+    return done
+
+
+def _transactional(method):
+    """Выполнение метода SimpleFS в транзакции (вложенный вызов - в текущей)"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.transaction():
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def _shared(method):
+    """Выполнение метода SimpleFS под разделяемой блокировкой образа"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock():
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def _exclusive(method):
+    """Выполнение метода SimpleFS под исключительной блокировкой образа"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock(exclusive=True):
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def _instrumented(method):
+    """Учет числа вызовов и времени публичного метода SimpleFS
+
+    При выключенной статистике обертка сразу вызывает метод.
+    """
+    name = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        stats = self._stats
+        if stats is None:
+            return method(self, *args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            stats.record(name, time.perf_counter() - started)
+    return wrapper
+
+
+class IOStats:
+    """Счетчики ввода-вывода SimpleFS
+
+    opens - открытия файлов (образа и хоста), seeks - перемещения позиции,
+    reads/writes - операции чтения и записи (образа и файлов хоста, для
+    отображения в память - обращения к срезам), bytes_read/bytes_written -
+    перенесенные байты, syncs - сбросы на диск (sync), calls - метод -> [вызовов, секунд].
+    При параллельных импорте и экспорте счетчики приблизительны.
+    """
+
+    COUNTERS = ('opens', 'seeks', 'reads', 'writes', 'syncs', 'bytes_read', 'bytes_written')
+
+    __slots__ = COUNTERS + ('calls', 'last')
+
+    def __init__(self):
+        for name in self.COUNTERS:
+            setattr(self, name, 0)
+        self.calls = {}
+        self.last = None  # (метод, секунд) последнего вызова
+
+    def record(self, name, elapsed):
+        calls = self.calls.get(name)
+        if calls is None:
+            self.calls[name] = [1, elapsed]
+        else:
+            calls[0] += 1
+            calls[1] += elapsed
+        self.last = (name, elapsed)
+
+    def snapshot(self):
+        """Счетчики словарем; calls - метод -> (вызовов, секунд),
+        last - (метод, секунд) последнего вызова"""
+        result = {name: getattr(self, name) for name in self.COUNTERS}
+        # Копия списка: снимок может браться из другого потока
+        result['calls'] = {name: tuple(value) for name, value in list(self.calls.items())}
+        result['last'] = self.last
+        return result
+
+    @classmethod
+    def delta(cls, after, before):
+        """Разность двух снимков"""
+        result = {name: after[name] - before[name] for name in cls.COUNTERS}
+        result['calls'] = {}
+        for name, (count, elapsed) in after['calls'].items():
+            old_count, old_elapsed = before['calls'].get(name, (0, 0.0))
+            if count != old_count:
+                result['calls'][name] = (count - old_count, elapsed - old_elapsed)
+        return result
+
+
+class OperationCancelled(Exception):
+    """Отмена операции: возбуждается обратным вызовом progress
+
+    Транзакционные операции при этом откатываются.
+    """
+
+
+class _Abort(Exception):
+    """Прерывание операции с откатом транзакции; текст - сообщение об ошибке"""
+
+
+class DirEntry:
+    """Запись каталога
+
+    size - длина файла в байтах (для каталога - размер первого блока),
+    num_entries - число записей каталога (для файла 0). Записи из кэша
+    каталогов общие, изменять их нельзя - новая запись строится replace().
+    """
+
+    __slots__ = ('name', 'is_dir', 'size', 'start_cluster', 'end_cluster', 'num_entries')
+
+    def __init__(self, name, is_dir, size, start_cluster, end_cluster, num_entries):
+        self.name = name
+        self.is_dir = is_dir
+        self.size = size
+        self.start_cluster = start_cluster
+        self.end_cluster = end_cluster
+        self.num_entries = num_entries
+
+    def replace(self, **changes):
+        """Копия записи с измененными полями"""
+        fields = {name: getattr(self, name) for name in self.__slots__}
+        fields.update(changes)
+        return DirEntry(**fields)
+
+    def __repr__(self):
+        kind = 'каталог' if self.is_dir else 'файл'
+        return (f"DirEntry({self.name!r}, {kind}, {self.size} байт, "
+                f"кластеры {self.start_cluster}-{self.end_cluster})")
+
+
+class _DirCache:
+    """Разобранные записи одного каталога (элемент кэша dcache)
+
+    blocks - блоки цепочки: (первый кластер, число кластеров, позиция в образе),
+    slots - записи по сквозным номерам слотов (None - слот свободен или
+    зарезервирован под ссылку), names - имя -> номер слота (хеш-индекс
+    каталога), free - куча номеров свободных слотов, broken - описание
+    поврежденной ссылки, на которой оборвана цепочка (для fsck).
+    """
+
+    __slots__ = ('blocks', 'first_slots', 'slots', 'names', 'free', 'broken')
+
+    def __init__(self):
+        self.blocks = []
+        self.first_slots = []  # номер первого слота каждого блока
+        self.slots = []
+        self.names = {}
+        self.free = []
+        self.broken = None
+
+    def add_block(self, start_cluster, clusters, pos, entries):
+        """Добавление блока; entries - все слоты блока, кроме слота-ссылки"""
+        base = len(self.slots)
+        self.blocks.append((start_cluster, clusters, pos))
+        self.first_slots.append(base)
+
+        for i, entry in enumerate(entries):
+            if entry is None:
+                heapq.heappush(self.free, base + i)
+            else:
+                self.names[entry.name] = base + i
+
+        self.slots.extend(entries)
+        self.slots.append(None)  # слот-ссылка на следующий блок
+
+    def pos(self, slot, entry_size):
+        """Позиция слота в образе"""
+        block = bisect.bisect_right(self.first_slots, slot) - 1
+        return self.blocks[block][2] + (slot - self.first_slots[block]) * entry_size
+
+    def clusters(self):
+        """Всего кластеров в цепочке"""
+        return sum(clusters for _, clusters, _ in self.blocks)
+
+    def put(self, slot, entry):
+        """Обновление слота с поддержкой индекса имен и списка свободных"""
+        old = self.slots[slot]
+        if old is not None and self.names.get(old.name) == slot:
+            del self.names[old.name]
+
+        if entry is None:
+            if old is not None:
+                heapq.heappush(self.free, slot)
+        else:
+            self.names[entry.name] = slot
+            if old is None:
+                if self.free[0] == slot:
+                    heapq.heappop(self.free)
+                else:
+                    self.free.remove(slot)
+                    heapq.heapify(self.free)
+
+        self.slots[slot] = entry
+
+
+class FreeExtentIndex:
+    """Индекс свободных экстентов (непрерывных участков свободных кластеров)
+
+    Экстенты хранятся в двух отсортированных списках: по началу (для
+    слияния с соседями при освобождении) и по паре (длина, начало) для
+    поиска наименьшего подходящего участка (best-fit) бинарным поиском.
+    """
+
+    def __init__(self):
+        self._starts = []  # отсортированные начала экстентов
+        self._lengths = {}  # начало -> длина
+        self._by_size = []  # отсортированные пары (длина, начало)
+        self.total = 0  # всего свободных кластеров
+
+    @classmethod
+    def from_bitmap(cls, bitmap, total_clusters):
+        """Построение индекса по битовой карте (1 - кластер свободен)"""
+        index = cls()
+        run_start = run_end = None
+
+        # Полностью свободные байты обрабатываются целыми сериями,
+        # побитово разбираются только частично занятые байты
+        for match in re.finditer(rb'\xff+|[^\x00\xff]', bitmap):
+            byte_start, byte_end = match.span()
+            if bitmap[byte_start] == 0xFF:
+                runs = ((byte_start * 8, byte_end * 8),)
+            else:
+                byte = bitmap[byte_start]
+                runs = [(byte_start * 8 + bit, byte_start * 8 + bit + 1)
+                        for bit in range(8) if (byte >> bit) & 1]
+
+            for lo, hi in runs:
+                if lo == run_end:
+                    run_end = hi
+                    continue
+                if run_start is not None:
+                    index._append(run_start, run_end, total_clusters)
+                run_start, run_end = lo, hi
+
+        if run_start is not None:
+            index._append(run_start, run_end, total_clusters)
+
+        index._by_size.sort()
+        return index
+
+    def _append(self, start, end, total_clusters):
+        """Добавление экстента в конец (только при построении)"""
+        end = min(end, total_clusters)
+        if end <= start:
+            return
+        self._starts.append(start)
+        self._lengths[start] = end - start
+        self._by_size.append((end - start, start))
+        self.total += end - start
+
+    def _add(self, start, length):
+        bisect.insort(self._starts, start)
+        self._lengths[start] = length
+        bisect.insort(self._by_size, (length, start))
+        self.total += length
+
+    def _remove(self, start):
+        length = self._lengths.pop(start)
+        del self._starts[bisect.bisect_left(self._starts, start)]
+        del self._by_size[bisect.bisect_left(self._by_size, (length, start))]
+        self.total -= length
+        return length
+
+    def allocate(self, count):
+        """Выделение непрерывного участка из count кластеров (best-fit)
+
+        Возвращает номер первого кластера или None, если подходящего
+        участка нет.
+        """
+        if count <= 0:
+            return None
+
+        pos = bisect.bisect_left(self._by_size, (count, -1))
+        if pos == len(self._by_size):
+            return None
+
+        length, start = self._by_size[pos]
+        self._remove(start)
+        if length > count:
+            self._add(start + count, length - count)
+        return start
+
+    def allocate_at(self, start, count):
+        """Выделение участка [start, start + count), если он целиком свободен"""
+        if count <= 0:
+            return False
+
+        pos = bisect.bisect_right(self._starts, start) - 1
+        if pos < 0:
+            return False
+
+        extent = self._starts[pos]
+        length = self._lengths[extent]
+        if extent + length < start + count:
+            return False
+
+        self._remove(extent)
+        if start > extent:
+            self._add(extent, start - extent)
+        if extent + length > start + count:
+            self._add(start + count, extent + length - start - count)
+        return True
+
+    def free(self, start, count):
+        """Возврат участка в индекс с объединением соседних экстентов"""
+        if count <= 0:
+            return
+
+        pos = bisect.bisect_left(self._starts, start)
+
+        # Сосед слева заканчивается ровно на start
+        if pos > 0:
+            prev = self._starts[pos - 1]
+            if prev + self._lengths[prev] == start:
+                count += self._remove(prev)
+                start = prev
+
+        # Сосед справа начинается сразу за освобожденным участком
+        following = start + count
+        if following in self._lengths:
+            count += self._remove(following)
+
+        self._add(start, count)
+
+    def largest(self):
+        """Размер наибольшего свободного экстента"""
+        return self._by_size[-1][0] if self._by_size else 0
+
+    def __len__(self):
+        return len(self._starts)
+
+
+class ExtentReader(io.RawIOBase):
+    """Чтение файла ФС с произвольным доступом (объект, возвращаемый open)
+
+    Файл занимает непрерывный участок образа, поэтому readinto копирует
+    данные прямо из отображения образа или читает их os.preadv - без
+    промежуточных буферов. Дескриптор действителен до размонтирования;
+    изменения файла после открытия через него не отслеживаются.
+    """
+
+    def __init__(self, fs, pos, size, name):
+        self._fs = fs
+        self._pos = pos  # начало файла в образе
+        self._size = size
+        self._offset = 0
+        self.name = name
+        self.mode = 'rb'
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        self._checkClosed()
+        count = max(0, min(len(buffer), self._size - self._offset))
+        if count:
+            with self._fs.lock(), memoryview(buffer) as view, \
+                    view.cast('B')[:count] as target:
+                self._fs._read_into(self._pos + self._offset, target)
+            self._offset += count
+        return count
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self._checkClosed()
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._offset + offset
+        elif whence == io.SEEK_END:
+            position = self._size + offset
+        else:
+            raise ValueError(f"Недопустимое значение whence: {whence}")
+        if position < 0:
+            raise ValueError(f"Отрицательная позиция: {position}")
+        self._offset = position
+        return position
+
+    def tell(self):
+        self._checkClosed()
+        return self._offset
+
+
+class SimpleFS:
+    def __init__(self, filename=None):
+        self.filename = filename
+        self.cluster_size = DEFAULT_CLUSTER_SIZE  # читается из заголовка образа
+        self.max_name_len = 16
+        self.dir_entry_size = DIR_ENTRY.size  # 30 байт
+        self.current_dir_cluster = None
+        self.dir_stack = []  # стек для навигации по каталогам
+        self._file = None  # открытый образ (держится до unmount)
+        self._mm = None  # отображение образа в память
+        self._dirty = []  # записанные и еще не сброшенные участки образа [начало, конец)
+        self._dcache = {}  # кластер каталога -> _DirCache
+        self._path_cache = OrderedDict()  # абсолютный путь каталога -> кластер (LRU)
+        self._stats = None  # IOStats при включенной статистике
+        self._tx_depth = 0  # глубина вложенности transaction()
+        self._pending = {}  # позиция -> данные: отложенные записи метаданных
+        self._locks = []  # стек удерживаемых блокировок (True - исключительная)
+        self._generation = None  # поколение метаданных, на котором построены кэши
+
+    def create_image(self, total_clusters, filename, cluster_size=DEFAULT_CLUSTER_SIZE,
+                     preallocate=False):
+        """Создание образа файловой системы
+
+        Записываются только заголовок, битовая карта и корневой каталог;
+        область данных создается разреженной (ftruncate) и читается как
+        нули. При preallocate место под весь образ резервируется сразу
+        (posix_fallocate, без него - записью нулей).
+        """
+        if (cluster_size < MIN_CLUSTER_SIZE or cluster_size > MAX_CLUSTER_SIZE
+                or cluster_size & (cluster_size - 1)):
+            raise ValueError(f"Размер кластера должен быть степенью двойки "
+                             f"от {MIN_CLUSTER_SIZE} до {MAX_CLUSTER_SIZE} байт")
+
+        # 1. Служебная область: заголовок и битовая карта свободных блоков
+        bitmap_bytes = (total_clusters + 7) // 8
+        clusters_for_meta = (HEADER_SIZE + bitmap_bytes + cluster_size - 1) // cluster_size
+
+        clusters_for_root = 1  # первый блок каталога - один кластер
+
+        total_used_clusters = clusters_for_meta + clusters_for_root
+        if total_used_clusters >= total_clusters:
+            raise ValueError("Слишком маленький размер файловой системы")
+        if total_clusters > 0xFFFFFFFF:
+            raise ValueError("Слишком большой размер файловой системы")
+
+        root_dir_cluster = clusters_for_meta
+
+        with open(filename, 'wb') as f:
+            # 2. Заголовок: сигнатура, версия, размер кластера, размеры ФС
+            header = bytearray(HEADER_SIZE)
+            FS_HEADER.pack_into(header, 0, FS_MAGIC, FS_VERSION, 0, cluster_size,
+                                total_clusters, bitmap_bytes, root_dir_cluster)
+            f.write(header)
+
+            # 3. Битовая карта свободных блоков: служебные кластеры и
+            # корневой каталог заняты
+            bitmap = bytearray(b'\xff' * bitmap_bytes)
+            _set_bits(bitmap, 0, total_used_clusters, free=False)
+            f.write(bitmap)
+
+            # 4. Корневой каталог
+            root_dir = bytearray(clusters_for_root * cluster_size)
+
+            # Запись текущего каталога '.'
+            root_dir[0] = 1  # занята
+            root_dir[1] = 1  # каталог
+            root_dir[2:18] = b'.' + b'\0' * 15
+            root_dir[18:22] = struct.pack('<I', root_dir_cluster)
+            root_dir[22:26] = struct.pack('<I', root_dir_cluster + clusters_for_root - 1)
+            root_dir[26:30] = struct.pack('<I', 2)  # '.' и '..'
+
+            # Запись родительского каталога '..' (ссылка на себя для корня)
+            root_dir[30] = 1  # занята
+            root_dir[31] = 1  # каталог
+            root_dir[32:48] = b'..' + b'\0' * 14
+            root_dir[48:52] = struct.pack('<I', root_dir_cluster)  # тот же каталог
+            root_dir[52:56] = struct.pack('<I', root_dir_cluster + clusters_for_root - 1)
+            root_dir[56:60] = struct.pack('<I', 2)  # две записи: '.' и '..'
+
+            f.seek(root_dir_cluster * cluster_size)
+            f.write(root_dir)
+
+            # 5. Область данных: разреженный хвост или зарезервированное место
+            total_bytes = total_clusters * cluster_size
+            if preallocate and hasattr(os, 'posix_fallocate'):
+                f.flush()
+                os.posix_fallocate(f.fileno(), 0, total_bytes)
+            elif preallocate:
+                zeros = bytes(CHUNK_SIZE)
+                remaining = total_bytes - f.tell()
+                while remaining > 0:
+                    remaining -= f.write(zeros[:min(remaining, CHUNK_SIZE)])
+            f.truncate(total_bytes)
+
+        return self.mount(filename)
+
+    @_instrumented
+    def mount(self, filename, use_mmap=True):
+        """Монтирование файловой системы
+
+        Образ открывается один раз и (по умолчанию) отображается в память,
+        все дальнейшие операции работают со срезами отображения.
+        Изменения сбрасываются на диск в sync()/unmount().
+        """
+        if not os.path.exists(filename):
+            return False
+
+        self.unmount()
+
+        self._file = self._open_host(filename, 'r+b')
+        self._locks = []
+        self._generation = None
+        with self.lock():
+            magic, version, _, cluster_size, total_clusters, bitmap_bytes, root_dir_cluster = \
+                FS_HEADER.unpack(self._file.read(FS_HEADER.size).ljust(FS_HEADER.size, b'\0'))
+            if magic != FS_MAGIC or version != FS_VERSION:
+                self._file.close()
+                self._file = None
+                return False
+
+            if use_mmap:
+                self._mm = mmap.mmap(self._file.fileno(), 0)
+            self.filename = filename
+
+            self.cluster_size = cluster_size
+            self.total_clusters = total_clusters
+            self.bitmap_bytes = bitmap_bytes
+            self.root_dir_cluster = root_dir_cluster
+            self.current_dir_cluster = self.root_dir_cluster
+            self.dir_stack = [(self.root_dir_cluster, "/")]
+
+            self._dcache = {}
+            self._path_cache.clear()
+            self._load_bitmap()
+            self._generation = self._read_generation()
+
+        return True
+
+    # Блокировки образа (fcntl.flock): чтение - под разделяемой, изменения
+    # - под исключительной. Блокировка держится на открытом образе, поэтому
+    # разграничивает процессы, но не потоки одного процесса.
+    @contextlib.contextmanager
+    def lock(self, exclusive=False):
+        """Блокировка образа от других процессов: with fs.lock(): ...
+
+        Разделяемую (по умолчанию) одновременно держат несколько читающих
+        процессов, исключительную (ее берет transaction()) - только один.
+        Вложенные блокировки входят во внешнюю, исключительная внутри
+        разделяемой повышает ее на время блока. При получении блокировки
+        сверяется счетчик поколений: если образ изменил другой процесс,
+        кэши каталогов и путей и битовая карта перечитываются.
+        """
+        outer = None if not self._locks else any(self._locks)
+        acquire = outer is None or (exclusive and not outer)
+        if acquire:
+            self._flock(exclusive)
+        self._locks.append(exclusive)
+        try:
+            if acquire and self._generation is not None:
+                self._revalidate()
+            yield self
+        finally:
+            self._locks.pop()
+            if acquire and self._file is not None:
+                # Снятие блокировки или возврат к внешней разделяемой
+                self._flock(None if outer is None else False)
+
+    def _flock(self, exclusive):
+        """Смена блокировки образа: True - исключительная, False - разделяемая, None - снять"""
+        if fcntl is None:
+            return
+        if exclusive is None:
+            operation = fcntl.LOCK_UN
+        else:
+            operation = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+        fcntl.flock(self._file.fileno(), operation)
+
+    def _read_generation(self):
+        """Счетчик поколений метаданных из заголовка образа"""
+        return FS_GENERATION.unpack(self._read(GENERATION_OFFSET, FS_GENERATION.size))[0]
+
+    def _revalidate(self):
+        """Сброс кэшей, если после их построения образ изменил другой процесс"""
+        generation = self._read_generation()
+        if generation != self._generation:
+            self._generation = generation
+            self._reload()
+
+    def _open_host(self, path, mode):
+        """Открытие файла хоста или образа (с учетом в статистике)"""
+        if self._stats is not None:
+            self._stats.opens += 1
+        return open(path, mode)
+
+    # Статистика ввода-вывода (по умолчанию выключена)
+    def enable_stats(self, enabled=True):
+        """Включение (со сбросом счетчиков) или выключение статистики"""
+        self._stats = IOStats() if enabled else None
+
+    def stats(self):
+        """Снимок статистики (см. IOStats.snapshot) или None, если она выключена"""
+        return None if self._stats is None else self._stats.snapshot()
+
+    @contextlib.contextmanager
+    def measure(self):
+        """Статистика блока операций: with fs.measure() as m: ...
+
+        После выхода из блока m содержит разность счетчиков за блок.
+        Если статистика была выключена, она включается только на время блока.
+        """
+        enabled = self._stats is not None
+        if not enabled:
+            self._stats = IOStats()
+        before = self._stats.snapshot()
+        result = {}
+        try:
+            yield result
+        finally:
+            result.update(IOStats.delta(self._stats.snapshot(), before))
+            if not enabled:
+                self._stats = None
+
+    @_instrumented
+    def sync(self):
+        """Сброс изменений образа на диск
+
+        Внутри транзакции метаданные не записываются - их запишет
+        завершение транзакции. Сбрасываются только записанные с прошлого
+        сброса участки: у отображения - msync каждого участка (MS_SYNC,
+        размер образа не меняется, и fsync не нужен), без него - fsync,
+        который пишет лишь измененные страницы. Если записей не было,
+        сброс не выполняется.
+        """
+        if self._tx_depth == 0:
+            self.commit()
+        dirty, self._dirty = self._dirty, []
+        if self._file is None or not dirty:
+            return
+
+        if self._mm is not None:
+            for lo, hi in _merge_ranges(dirty):
+                lo -= lo % mmap.PAGESIZE  # msync требует выровненного начала
+                self._mm.flush(lo, hi - lo)
+        else:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        if self._stats is not None:
+            self._stats.syncs += 1
+
+    def unmount(self):
+        """Размонтирование: сброс изменений и закрытие образа"""
+        if self._file is None:
+            return
+        self.sync()
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        self._file.close()  # закрытие снимает и блокировку
+        self._file = None
+        self._locks = []
+        self._generation = None
+        self._dcache = {}
+        self.filename = None
+
+    # Без отображения в память используются pread/pwrite: они не двигают
+    # позицию файла, поэтому безопасны при параллельных операциях
+    def _read(self, pos, size):
+        """Чтение size байт образа с позиции pos"""
+        stats = self._stats
+        if stats is not None:
+            stats.reads += 1
+            stats.bytes_read += size
+        if self._mm is not None:
+            return self._mm[pos:pos + size]
+        if hasattr(os, 'pread'):
+            return os.pread(self._file.fileno(), size, pos)
+        if stats is not None:
+            stats.seeks += 1
+        self._file.seek(pos)
+        return self._file.read(size)
+
+    def _read_into(self, pos, buf):
+        """Чтение участка образа с позиции pos в готовый буфер"""
+        stats = self._stats
+        if stats is not None:
+            stats.reads += 1
+            stats.bytes_read += len(buf)
+            if self._mm is None and not hasattr(os, 'preadv'):
+                stats.seeks += 1
+        if self._mm is not None:
+            with self._view(pos, len(buf)) as data:
+                buf[:] = data
+        elif hasattr(os, 'preadv'):
+            os.preadv(self._file.fileno(), [buf], pos)
+        else:
+            self._file.seek(pos)
+            self._file.readinto(buf)
+
+    def _view(self, pos, size):
+        """Представление участка образа без копирования (memoryview)
+
+        В статистике не учитывается: участок может быть как источником,
+        так и приемником данных - учет ведет вызывающий.
+        """
+        if self._mm is not None:
+            return memoryview(self._mm)[pos:pos + size]
+        if hasattr(os, 'pread'):
+            return memoryview(os.pread(self._file.fileno(), size, pos))
+        self._file.seek(pos)
+        return memoryview(self._file.read(size))
+
+    def _write(self, pos, data):
+        """Запись данных в образ с позиции pos"""
+        self._dirty.append((pos, pos + len(data)))
+        stats = self._stats
+        if stats is not None:
+            stats.writes += 1
+            stats.bytes_written += len(data)
+            if self._mm is None and not hasattr(os, 'pwrite'):
+                stats.seeks += 1
+        if self._mm is not None:
+            self._mm[pos:pos + len(data)] = data
+        elif hasattr(os, 'pwrite'):
+            view = memoryview(data)
+            while view:
+                view = view[os.pwrite(self._file.fileno(), view, pos):]
+                pos = pos + len(data) - len(view)
+        else:
+            self._file.seek(pos)
+            self._file.write(data)
+
+    def _copy_in(self, src, pos, size, progress=None):
+        """Потоковая запись size байт из открытого файла src в образ
+
+        Данные читаются блоками CHUNK_SIZE через readinto: при отображении
+        в память - прямо в участок образа, иначе в один заранее выделенный
+        буфер. Возвращает число записанных байт.
+        """
+        buf = None if self._mm is not None else memoryview(bytearray(min(size, CHUNK_SIZE)))
+        stats = self._stats
+        started = time.monotonic()
+        done = 0
+
+        while done < size:
+            chunk = min(CHUNK_SIZE, size - done)
+            if buf is None:
+                with self._view(pos + done, chunk) as target:
+                    n = src.readinto(target)
+                if n:
+                    self._dirty.append((pos + done, pos + done + n))
+                if stats is not None and n:
+                    stats.writes += 1
+                    stats.bytes_written += n
+            else:
+                n = src.readinto(buf[:chunk])
+                if n:
+                    self._write(pos + done, buf[:n])
+            if stats is not None:
+                stats.reads += 1
+                stats.bytes_read += n or 0
+            if not n:
+                break
+            done += n
+            _report_progress(progress, done, size, started)
+
+        return done
+
+    def _copy_out(self, dst, pos, size, progress=None, zero_copy=True):
+        """Потоковое чтение size байт образа с позиции pos в файл dst
+
+        При zero_copy участок копируется в ядре (copy_file_range/sendfile),
+        через буфер - только то, что ядро скопировать не смогло.
+        """
+        copied = 0
+        if zero_copy and size:
+            dst.flush()
+            if self._mm is None:
+                self._file.flush()
+            copied = _kernel_copy(self._file.fileno(), pos, dst.fileno(), size, progress)
+            pos += copied
+            size -= copied
+
+        buf = None if self._mm is not None else memoryview(bytearray(min(size, CHUNK_SIZE)))
+        stats = self._stats
+        if stats is not None and copied:
+            # Копирование в ядре учитывается как одна пара чтение/запись
+            stats.reads += 1
+            stats.writes += 1
+            stats.bytes_read += copied
+            stats.bytes_written += copied
+        started = time.monotonic()
+        done = 0
+
+        while done < size:
+            chunk = min(CHUNK_SIZE, size - done)
+            if buf is None:
+                with self._view(pos + done, chunk) as data:
+                    dst.write(data)
+                if stats is not None:
+                    stats.reads += 1
+                    stats.bytes_read += chunk
+            else:
+                self._read_into(pos + done, buf[:chunk])
+                dst.write(buf[:chunk])
+            if stats is not None:
+                stats.writes += 1
+                stats.bytes_written += chunk
+            done += chunk
+            _report_progress(progress, done, size, started)
+
+        return copied + done
+
+    def _move(self, src, dst, size):
+        """Перенос size байт образа с позиции src на позицию dst
+
+        Копирование идет вперед блоками CHUNK_SIZE, поэтому участки могут
+        перекрываться, только если dst < src: каждый блок читается раньше,
+        чем затирается.
+        """
+        if self._mm is not None:
+            self._dirty.append((dst, dst + size))
+        done = 0
+        while done < size:
+            chunk = min(CHUNK_SIZE, size - done)
+            if self._mm is not None:
+                self._mm.move(dst + done, src + done, chunk)
+            else:
+                self._write(dst + done, self._read(src + done, chunk))
+            done += chunk
+
+    def _zero(self, pos, size):
+        """Заполнение участка образа нулями"""
+        zeros = bytes(min(size, CHUNK_SIZE))
+        done = 0
+        while done < size:
+            chunk = min(CHUNK_SIZE, size - done)
+            self._write(pos + done, zeros[:chunk])
+            done += chunk
+
+    def _write_meta(self, pos, data):
+        """Запись метаданных: внутри транзакции откладывается до ее завершения"""
+        if self._tx_depth:
+            old = self._pending.get(pos)
+            if old is not None and len(old) > len(data):
+                # Запись внутри ранее записанного блока (например, слот '.'
+                # нового каталога) накладывается на него на месте
+                old[:len(data)] = data
+            else:
+                # Повторная запись по той же позиции переносится в конец очереди
+                self._pending.pop(pos, None)
+                self._pending[pos] = bytearray(data)
+        else:
+            self._write(pos, data)
+
+    @contextlib.contextmanager
+    def transaction(self, sync=True):
+        """Транзакция метаданных: with fs.transaction(): ...
+
+        Изменения битовой карты, записей каталогов и счетчиков копятся в
+        памяти и записываются при выходе одним упорядоченным сбросом
+        (битовая карта, затем записи каталогов в порядке изменения) и одним
+        сбросом на диск. Вложенные транзакции входят во внешнюю. При исключении
+        изменения метаданных отбрасываются. Вся транзакция выполняется под
+        исключительной блокировкой образа. С sync=False изменения
+        записываются в образ, но сброс на диск остается следующему sync().
+        """
+        with self.lock(exclusive=True):
+            self._tx_depth += 1
+            try:
+                yield self
+            except BaseException:
+                self._tx_depth -= 1
+                if self._tx_depth == 0:
+                    self._rollback()
+                raise
+            self._tx_depth -= 1
+            if self._tx_depth == 0:
+                if sync:
+                    self.sync()
+                else:
+                    self.commit()
+
+    def _rollback(self):
+        """Отмена незаписанных изменений метаданных"""
+        self._pending = {}
+        self._reload()
+
+    def _reload(self):
+        """Перечитывание метаданных с диска: сброс кэшей и битовой карты"""
+        self._dcache = {}
+        self._path_cache.clear()
+        self._load_bitmap()
+        if not self.change_directory(self.get_current_path())[0]:
+            self.change_directory('/')
+
+    def _load_bitmap(self):
+        """Загрузка битовой карты в память и подсчет свободных кластеров"""
+        self._bitmap = bytearray(self._read(HEADER_SIZE, self.bitmap_bytes))
+        self._bitmap_dirty = []  # измененные диапазоны байт [начало, конец)
+
+        # Биты за пределами total_clusters в последнем байте не учитываются
+        full_bytes, tail_bits = divmod(self.total_clusters, 8)
+        self.free_count = int.from_bytes(self._bitmap[:full_bytes], 'little').bit_count()
+        if tail_bits:
+            self.free_count += (self._bitmap[full_bytes] & ((1 << tail_bits) - 1)).bit_count()
+
+        self._extents = FreeExtentIndex.from_bitmap(self._bitmap, self.total_clusters)
+
+    def _mark_bitmap_dirty(self, lo, hi):
+        """Пометить байты битовой карты [lo, hi) как измененные"""
+        self._bitmap_dirty.append((lo, hi))
+
+    def commit(self):
+        """Запись отложенных изменений: измененных участков битовой карты,
+        затем записей каталогов и последним - нового поколения"""
+        if not self._bitmap_dirty and not self._pending:
+            return
+
+        with self.lock(exclusive=True):
+            if self._bitmap_dirty:
+                self._flush_bitmap()
+
+            pending, self._pending = self._pending, {}
+            for pos, data in pending.items():
+                self._write(pos, data)
+
+            self._generation += 1
+            self._write(GENERATION_OFFSET, FS_GENERATION.pack(self._generation))
+
+    def _flush_bitmap(self):
+        """Запись в образ только измененных участков битовой карты"""
+        ranges, self._bitmap_dirty = self._bitmap_dirty, []
+        for lo, hi in _merge_ranges(ranges):
+            self._write(HEADER_SIZE + lo, self._bitmap[lo:hi])
+
+    @_shared
+    def generation(self):
+        """Поколение метаданных образа: меняется при каждом изменении
+        метаданных (в том числе другим процессом)"""
+        return self._generation
+
+    @_shared
+    def free_space(self):
+        """Свободное место в байтах (без сканирования битовой карты)"""
+        return self.free_count * self.cluster_size
+
+    @_shared
+    def fragmentation(self):
+        """Фрагментация свободного места: (число свободных участков,
+        размер наибольшего участка в кластерах)"""
+        return len(self._extents), self._extents.largest()
+
+    @_shared
+    def read_bitmap(self):
+        """Чтение битовой карты"""
+        return bytes(self._bitmap)
+
+    def _set_range(self, start, count, free):
+        """Установка битов кластеров [start, start + count) в битовой карте"""
+        self._mark_bitmap_dirty(*_set_bits(self._bitmap, start, count, free))
+
+    def allocate_extent(self, count):
+        """Выделение непрерывного участка кластеров
+
+        Возвращает номер первого кластера или None, если непрерывного
+        участка нужной длины нет.
+        """
+        start = self._extents.allocate(count)
+        if start is None:
+            return None
+
+        self._set_range(start, count, free=False)
+        self.free_count -= count
+        return start
+
+    def allocate_at(self, start, count):
+        """Выделение участка, начинающегося с кластера start (рост файла на месте)
+
+        Возвращает False, если хотя бы один из кластеров занят.
+        """
+        if start + count > self.total_clusters or not self._extents.allocate_at(start, count):
+            return False
+
+        self._set_range(start, count, free=False)
+        self.free_count -= count
+        return True
+
+    def free_extent(self, start, count):
+        """Освобождение непрерывного участка кластеров"""
+        if count <= 0:
+            return
+
+        self._set_range(start, count, free=True)
+        self.free_count += count
+        self._extents.free(start, count)
+
+        # Отложенные записи в освобожденные кластеры (блоки удаленных
+        # каталогов) отбрасываются: данные файлов пишутся сразу, и если
+        # кластеры выделят снова, завершение транзакции затерло бы их
+        if self._pending:
+            lo, hi = start * self.cluster_size, (start + count) * self.cluster_size
+            for pos in [pos for pos in self._pending if lo <= pos < hi]:
+                del self._pending[pos]
+
+    def free_extents(self, extents):
+        """Освобождение набора участков (start, count) одним проходом
+
+        Участки сортируются, соседние сливаются, так что битовая карта и
+        индекс свободных участков обновляются по разу на каждую серию.
+        """
+        run_start, run_end = None, None
+        for start, count in sorted(extents):
+            if count <= 0:
+                continue
+            if start == run_end:
+                run_end += count
+                continue
+            if run_start is not None:
+                self.free_extent(run_start, run_end - run_start)
+            run_start, run_end = start, start + count
+        if run_start is not None:
+            self.free_extent(run_start, run_end - run_start)
+
+    def _entry_clusters(self, entry):
+        """Число кластеров, занятых файлом или каталогом"""
+        if entry.is_dir:
+            return entry.end_cluster - entry.start_cluster + 1
+        return (entry.size + self.cluster_size - 1) // self.cluster_size
+
+    def _parse_entry(self, buf, offset=0):
+        """Разбор записи каталога с позиции offset буфера (None - запись свободна)"""
+        occupied, kind, name, start_cluster, end_cluster, counter = \
+            DIR_ENTRY.unpack_from(buf, offset)
+        if not occupied:
+            return None
+        return self._make_entry(name.decode('ascii', errors='ignore').rstrip('\0'),
+                                kind == 1, start_cluster, end_cluster, counter)
+
+    def _pack_entry(self, entry):
+        """Упаковка записи каталога в dir_entry_size байт"""
+        counter = entry.num_entries if entry.is_dir else entry.size
+        return DIR_ENTRY.pack(1, 1 if entry.is_dir else 0, entry.name.encode('ascii'),
+                              entry.start_cluster, entry.end_cluster, counter)
+
+    def _make_entry(self, name, is_dir, start_cluster, end_cluster, counter):
+        """Новая запись каталога; counter - число записей или длина файла"""
+        # Для файла хранится точная длина, каталог занимает свой участок целиком
+        if is_dir:
+            return DirEntry(name, True, (end_cluster - start_cluster + 1) * self.cluster_size,
+                            start_cluster, end_cluster, counter)
+        return DirEntry(name, False, counter, start_cluster, end_cluster, 0)
+
+    def _pack_link(self, start_cluster, end_cluster):
+        """Запись-ссылка на следующий блок каталога"""
+        return DIR_ENTRY.pack(1, ENTRY_LINK, b'', start_cluster, end_cluster, 0)
+
+    def _dir(self, dir_cluster):
+        """Разобранный каталог из кэша (при промахе - чтение цепочки блоков)"""
+        cached = self._dcache.get(dir_cluster)
+        if cached is not None:
+            return cached
+
+        cached = _DirCache()
+        size = self.dir_entry_size
+        start, clusters = dir_cluster, 1
+        seen = set()
+
+        while True:
+            seen.add(start)
+            pos = start * self.cluster_size
+            nslots = clusters * self.cluster_size // size
+            if self._stats is not None:
+                self._stats.reads += 1
+                self._stats.bytes_read += clusters * self.cluster_size
+            with self._view(pos, clusters * self.cluster_size) as block:
+                cached.add_block(start, clusters, pos,
+                                 [self._parse_entry(block, i * size)
+                                  for i in range(nslots - 1)])
+
+                # Последний слот блока - ссылка на следующий блок
+                occupied, kind, _, next_start, next_end, _ = \
+                    DIR_ENTRY.unpack_from(block, (nslots - 1) * size)
+            if occupied != 1 or kind != ENTRY_LINK:
+                break
+
+            # Поврежденная ссылка обрывает цепочку (fsck сообщает об этом)
+            if next_start in seen:
+                cached.broken = f"ссылка на уже пройденный блок {next_start}"
+                break
+            if (next_start < self.root_dir_cluster or next_end < next_start
+                    or next_end >= self.total_clusters):
+                cached.broken = f"ссылка на кластеры {next_start}-{next_end} вне области данных"
+                break
+            start, clusters = next_start, next_end - next_start + 1
+
+        self._dcache[dir_cluster] = cached
+        return cached
+
+    def _grow_dir(self, dir_cluster):
+        """Добавление блока в цепочку каталога (размер цепочки удваивается)"""
+        cached = self._dir(dir_cluster)
+        clusters = min(cached.clusters(), max(1, DIR_MAX_BLOCK_BYTES // self.cluster_size))
+
+        # При нехватке непрерывного места пробуем блоки меньше
+        start = None
+        while clusters and start is None:
+            start = self.allocate_extent(clusters)
+            if start is None:
+                clusters //= 2
+        if start is None:
+            return False
+
+        pos = start * self.cluster_size
+        self._write_meta(pos, bytes(clusters * self.cluster_size))
+        link_slot = len(cached.slots) - 1
+        self._write_meta(cached.pos(link_slot, self.dir_entry_size),
+                         self._pack_link(start, start + clusters - 1))
+
+        nslots = clusters * self.cluster_size // self.dir_entry_size
+        cached.add_block(start, clusters, pos, [None] * (nslots - 1))
+        return True
+
+    def _collect_tree(self, dir_cluster, extents):
+        """Сбор участков каталога и всего его поддерева в список extents
+
+        Каталоги поддерева удаляются из кэша; их записи не обнуляются -
+        блоки освобождаются целиком, и до повторного выделения их никто
+        не читает. Возвращает кластеры удаленных каталогов.
+        """
+        removed = []
+        stack = [dir_cluster]
+        while stack:
+            cluster = stack.pop()
+            cached = self._dir(cluster)
+            extents.extend((start, clusters) for start, clusters, _ in cached.blocks)
+            for entry in cached.slots:
+                if entry is None or entry.name in ('', '.', '..'):
+                    continue
+                if entry.is_dir:
+                    stack.append(entry.start_cluster)
+                else:
+                    extents.append((entry.start_cluster, self._entry_clusters(entry)))
+            del self._dcache[cluster]
+            removed.append(cluster)
+        return removed
+
+    def _lookup(self, dir_cluster, name):
+        """Поиск записи по имени: (слот, запись) или (None, None)"""
+        cached = self._dir(dir_cluster)
+        slot = cached.names.get(name)
+        if slot is None:
+            return None, None
+        return slot, cached.slots[slot]
+
+    def _set_entry(self, dir_cluster, slot, entry):
+        """Запись слота каталога (None - освободить) на диск и в кэш"""
+        cached = self._dir(dir_cluster)
+        pos = cached.pos(slot, self.dir_entry_size)
+
+        if entry is None:
+            self._write_meta(pos, bytes(self.dir_entry_size))
+        else:
+            self._write_meta(pos, self._pack_entry(entry))
+        cached.put(slot, entry)
+
+    def _valid_name(self, name):
+        """Проверка имени элемента каталога (без учета длины)"""
+        return (bool(name) and name not in ('.', '..') and name.isascii()
+                and '/' not in name and '\0' not in name)
+
+    def _abspath(self, path):
+        """Нормализованный абсолютный путь (относительный - от текущего каталога)"""
+        if not path.startswith('/'):
+            path = posixpath.join(self.get_current_path(), path)
+        return posixpath.normpath('/' + path.lstrip('/'))
+
+    def _resolve_dir(self, path):
+        """Кластер каталога по нормализованному абсолютному пути (None - не найден)
+
+        Разрешенные префиксы пути запоминаются в LRU-кэше, поэтому обход
+        идет только от ближайшего уже известного каталога.
+        """
+        if path == '/':
+            return self.root_dir_cluster
+
+        cluster = self._path_cache.get(path)
+        if cluster is not None:
+            self._path_cache.move_to_end(path)
+            return cluster
+
+        parent, name = posixpath.split(path)
+        parent_cluster = self._resolve_dir(parent)
+        if parent_cluster is None:
+            return None
+
+        entry = self._lookup(parent_cluster, name)[1]
+        if entry is None or not entry.is_dir:
+            return None
+
+        cluster = entry.start_cluster
+        self._path_cache[path] = cluster
+        if len(self._path_cache) > PATH_CACHE_SIZE:
+            self._path_cache.popitem(last=False)
+        return cluster
+
+    def _split_path(self, path, dir_cluster=None):
+        """Разбор пути на (кластер родительского каталога, имя)
+
+        При явно заданном dir_cluster path - просто имя в этом каталоге.
+        Если родительский каталог не найден, кластер равен None.
+        """
+        if dir_cluster is not None:
+            return dir_cluster, path
+        parent, name = posixpath.split(self._abspath(path))
+        return self._resolve_dir(parent), name
+
+    def _invalidate_paths(self, old_path, new_path=None):
+        """Сброс кэша путей после переименования, перемещения или удаления каталога
+
+        Текущий каталог, оказавшийся внутри old_path, переносится в new_path
+        (при удалении - в корень).
+        """
+        self._path_cache.clear()
+
+        current = self.get_current_path()
+        if current != old_path and not current.startswith(old_path + '/'):
+            return
+        if new_path is None:
+            self.change_directory('/')
+        else:
+            self.dir_stack = [(cluster, new_path + path[len(old_path):])
+                              if path == old_path or path.startswith(old_path + '/')
+                              else (cluster, path)
+                              for cluster, path in self.dir_stack]
+
+    @_instrumented
+    @_shared
+    def resolve(self, path):
+        """Запись элемента по пути (абсолютному или от текущего каталога)
+
+        Навигация (текущий каталог) не меняется. Для корня возвращается
+        запись '.' корневого каталога, для отсутствующего пути - None.
+        """
+        path = self._abspath(path)
+        if path == '/':
+            return self._lookup(self.root_dir_cluster, '.')[1]
+
+        dir_cluster, name = self._split_path(path)
+        if dir_cluster is None:
+            return None
+        return self._lookup(dir_cluster, name)[1]
+
+    @_instrumented
+    @_shared
+    def read_dir(self, dir_cluster=None):
+        """Чтение содержимого каталога (записи из кэша, изменять нельзя)
+
+        dir_cluster - кластер или путь каталога, по умолчанию текущий.
+        """
+        if dir_cluster is None:
+            dir_cluster = self.current_dir_cluster
+        elif isinstance(dir_cluster, str):
+            path = dir_cluster
+            dir_cluster = self._resolve_dir(self._abspath(path))
+            if dir_cluster is None:
+                raise FileNotFoundError(f"Каталог не найден: {path}")
+
+        return [entry for entry in self._dir(dir_cluster).slots
+                if entry is not None and entry.name not in ('', '.', '..')]
+
+    def find_free_dir_entry(self, dir_cluster):
+        """Поиск свободной записи в каталоге (при необходимости каталог растет)"""
+        cached = self._dir(dir_cluster)
+        if not cached.free and not self._grow_dir(dir_cluster):
+            return None
+        return cached.free[0]
+
+    def update_dir_entry_count(self, dir_cluster, delta):
+        """Обновление счетчика записей в каталоге"""
+        # Счетчик хранится в записи текущего каталога '.'
+        slot, entry = self._lookup(dir_cluster, '.')
+        if entry is None:
+            return
+
+        entry = entry.replace(num_entries=max(2, entry.num_entries + delta))  # минимум '.' и '..'
+        self._set_entry(dir_cluster, slot, entry)
+
+    @_instrumented
+    @_transactional
+    def copy_to_fs(self, src_path, dest_name, dest_dir_cluster=None, progress=None):
+        """Копирование файла в файловую систему
+
+        Файл копируется потоком блоками по CHUNK_SIZE, память не зависит
+        от его размера. progress(done, total, bytes_per_sec) вызывается
+        после каждого блока. dest_name может быть путем в ФС.
+        """
+        dest_dir_cluster, dest_name = self._split_path(dest_name, dest_dir_cluster)
+        if dest_dir_cluster is None:
+            return False, "Каталог не найден"
+
+        # Открыть исходный файл
+        try:
+            src = self._open_host(src_path, 'rb')
+        except OSError:
+            return False, "Не удалось прочитать исходный файл"
+
+        with src:
+            success, message = self._new_file(dest_dir_cluster, dest_name,
+                                              os.fstat(src.fileno()).st_size, src, progress)
+        if not success:
+            return False, message
+        return True, "Файл успешно скопирован"
+
+    @_instrumented
+    @_shared
+    def copy_from_fs(self, src_name, dest_path, src_dir_cluster=None, progress=None,
+                     zero_copy=True):
+        """Копирование файла из файловой системы
+
+        Файл занимает непрерывный участок образа, поэтому по умолчанию он
+        копируется в ядре без участия интерпретатора; иначе - потоком
+        блоками CHUNK_SIZE. src_name может быть путем в ФС.
+        """
+        src_dir_cluster, src_name = self._split_path(src_name, src_dir_cluster)
+        if src_dir_cluster is None:
+            return False, "Файл не найден"
+
+        file_entry = self._lookup(src_dir_cluster, src_name)[1]
+        if not file_entry or file_entry.is_dir:
+            return False, "Файл не найден"
+
+        # Данные файла - непрерывный участок образа
+        start = file_entry.start_cluster * self.cluster_size
+
+        # Записать файл
+        try:
+            with self._open_host(dest_path, 'wb') as f:
+                self._copy_out(f, start, file_entry.size, progress, zero_copy)
+            return True, "Файл успешно скопирован"
+        except OSError:
+            return False, "Не удалось записать файл"
+
+    @_instrumented
+    @_shared
+    def open(self, path, mode='rb', buffering=io.DEFAULT_BUFFER_SIZE):
+        """Открытие файла ФС на чтение: fs.open(path, 'rb')
+
+        Возвращает io.BufferedReader над ExtentReader (при buffering=0 -
+        сам ExtentReader) с поддержкой seek; данные читаются по запросу,
+        файл целиком в память не загружается.
+        """
+        if mode not in ('r', 'rb'):
+            raise ValueError(f"Поддерживается только чтение ('rb'), получено: {mode!r}")
+
+        entry = self.resolve(path)
+        if entry is None:
+            raise FileNotFoundError(f"Файл не найден: {path}")
+        if entry.is_dir:
+            raise IsADirectoryError(f"Это каталог: {path}")
+
+        raw = ExtentReader(self, entry.start_cluster * self.cluster_size,
+                           entry.size, path)
+        if buffering == 0:
+            return raw
+        return io.BufferedReader(raw, buffering)
+
+    def _lookup_file(self, path):
+        """Поиск файла по пути: (кластер каталога, слот, запись) или (None, None, None)"""
+        dir_cluster, name = self._split_path(path)
+        if dir_cluster is None:
+            return None, None, None
+        slot, entry = self._lookup(dir_cluster, name)
+        if entry is None or entry.is_dir:
+            return None, None, None
+        return dir_cluster, slot, entry
+
+    def _resize(self, entry, size, zero_end=None):
+        """Изменение участка файла под новый размер
+
+        Уменьшение освобождает хвост, увеличение сначала пытается занять
+        кластеры сразу за участком и только при неудаче переносит файл
+        на новый участок. Возвращает новую запись или None при нехватке места.
+        Байты от старого конца файла до zero_end (по умолчанию - до нового
+        конца) обнуляются; остальное вызывающий запишет сам.
+        """
+        start = entry.start_cluster
+        old_count = self._entry_clusters(entry)
+        new_count = (size + self.cluster_size - 1) // self.cluster_size
+
+        if new_count <= old_count:
+            self.free_extent(start + new_count, old_count - new_count)
+            if not new_count:
+                start = 0
+        elif not old_count:
+            start = self.allocate_extent(new_count)
+            if start is None:
+                return None
+        elif not self.allocate_at(start + old_count, new_count - old_count):
+            new_start = self.allocate_extent(new_count)
+            if new_start is None:
+                return None
+            self._move(start * self.cluster_size, new_start * self.cluster_size, entry.size)
+            self.free_extent(start, old_count)
+            start = new_start
+
+        zero_end = size if zero_end is None else min(zero_end, size)
+        if zero_end > entry.size:
+            self._zero(start * self.cluster_size + entry.size, zero_end - entry.size)
+
+        return self._make_entry(entry.name, False, start,
+                                start + max(new_count, 1) - 1, size)
+
+    @_instrumented
+    @_transactional
+    def create_file(self, path, size=0, fill=True):
+        """Создание файла размером size байт, заполненного нулями
+
+        Файлу сразу выделяется непрерывный участок под весь размер, поэтому
+        данные затем можно писать блоками через write_at без переноса файла.
+        С fill=False участок не обнуляется: содержимое файла не определено,
+        пока его целиком не перепишет вызывающий.
+        """
+        dir_cluster, name = self._split_path(path)
+        if dir_cluster is None:
+            return False, "Каталог не найден"
+
+        success, message = self._new_file(dir_cluster, name, size, fill=fill)
+        if not success:
+            return False, message
+        return True, "Файл создан"
+
+    def _new_file(self, dir_cluster, name, size, src=None, progress=None, fill=True):
+        """Создание записи файла с участком под size байт (общая часть
+        copy_to_fs и create_file): (успех, сообщение об ошибке)"""
+        if len(name) > self.max_name_len:
+            return False, "Имя файла слишком длинное"
+
+        if not self._valid_name(name):
+            return False, "Недопустимое имя файла"
+
+        # Проверить, существует ли уже файл с таким именем
+        if self._lookup(dir_cluster, name)[1] is not None:
+            return False, "Файл с таким именем уже существует"
+
+        if size < 0:
+            return False, "Недопустимый размер"
+        if size > MAX_FILE_SIZE:
+            return False, "Файл слишком большой"
+        clusters_needed = (size + self.cluster_size - 1) // self.cluster_size
+
+        # Найти свободную запись в каталоге
+        entry_idx = self.find_free_dir_entry(dir_cluster)
+        if entry_idx is None:
+            return False, "Каталог полон"
+
+        # Выделить непрерывный участок кластеров (пустому файлу не нужен)
+        first_cluster = 0
+        if clusters_needed:
+            first_cluster = self.allocate_extent(clusters_needed)
+            if first_cluster is None:
+                return False, "Недостаточно свободного места"
+
+        # Записать данные файла потоком в непрерывный участок
+        pos = first_cluster * self.cluster_size
+        if src is None:
+            if fill:
+                self._zero(pos, size)
+        else:
+            try:
+                copied = self._copy_in(src, pos, size, progress)
+            except OSError:
+                copied = -1
+            if copied != size:
+                self.free_extent(first_cluster, clusters_needed)
+                return False, "Не удалось прочитать исходный файл"
+
+        # Записать запись в каталог
+        self._set_entry(dir_cluster, entry_idx,
+                        self._make_entry(name, False, first_cluster,
+                                         first_cluster + max(clusters_needed, 1) - 1, size))
+
+        # Обновить счетчик записей в каталоге
+        self.update_dir_entry_count(dir_cluster, 1)
+        return True, None
+
+    @_instrumented
+    def write_at(self, path, offset, data, sync=True):
+        """Запись data в файл с позиции offset
+
+        Запись за концом файла увеличивает его (промежуток заполняется
+        нулями). Переписываются только затронутые байты; участок файла
+        растет на месте, если следующие за ним кластеры свободны. С
+        sync=False данные не сбрасываются на диск - серию записей завершает
+        один вызов sync().
+        """
+        with self.transaction(sync=sync):
+            return self._write_at(path, offset, data)
+
+    def _write_at(self, path, offset, data):
+        """Запись write_at внутри транзакции"""
+        dir_cluster, slot, entry = self._lookup_file(path)
+        if entry is None:
+            return False, "Файл не найден"
+        if offset < 0:
+            return False, "Недопустимая позиция"
+
+        end = offset + len(data)
+        if end > MAX_FILE_SIZE:
+            return False, "Файл слишком большой"
+
+        if end > entry.size:
+            # Обнуляется только промежуток до offset, дальше запишется data
+            new_entry = self._resize(entry, end, zero_end=offset)
+            if new_entry is None:
+                return False, "Недостаточно свободного места"
+            self._set_entry(dir_cluster, slot, new_entry)
+            entry = new_entry
+
+        if data:
+            self._write(entry.start_cluster * self.cluster_size + offset, data)
+        return True, f"Записано байт: {len(data)}"
+
+    @_instrumented
+    @_transactional
+    def append(self, path, data):
+        """Дозапись data в конец файла
+
+        Размер файла читается в той же транзакции (под исключительной
+        блокировкой), что и запись: иначе дозапись другого процесса,
+        сделанная между ними, была бы затерта.
+        """
+        entry = self._lookup_file(path)[2]
+        if entry is None:
+            return False, "Файл не найден"
+        return self.write_at(path, entry.size, data)
+
+    @_instrumented
+    @_transactional
+    def truncate(self, path, size):
+        """Изменение размера файла (увеличение дополняет файл нулями)"""
+        dir_cluster, slot, entry = self._lookup_file(path)
+        if entry is None:
+            return False, "Файл не найден"
+        if size < 0 or size > MAX_FILE_SIZE:
+            return False, "Недопустимый размер"
+
+        new_entry = self._resize(entry, size)
+        if new_entry is None:
+            return False, "Недостаточно свободного места"
+        self._set_entry(dir_cluster, slot, new_entry)
+        return True, f"Размер файла: {size} байт"
+
+    @_instrumented
+    @_transactional
+    def delete_item(self, name, is_dir=False):
+        """Удаление файла или каталога (name - имя или путь)"""
+        path = self._abspath(name)
+        dir_cluster, name = self._split_path(path)
+        if dir_cluster is None:
+            return False, "Элемент не найден"
+
+        slot, item_entry = self._lookup(dir_cluster, name)
+
+        if (not item_entry or item_entry.is_dir != is_dir
+                or name in ('.', '..')):
+            return False, "Элемент не найден"
+
+        if is_dir:
+            # Поддерево освобождается одним пакетом; обнуляется только его запись
+            extents = []
+            self._collect_tree(item_entry.start_cluster, extents)
+            self.free_extents(extents)
+            self._invalidate_paths(path)
+        else:
+            # Освободить кластеры
+            self.free_extent(item_entry.start_cluster, self._entry_clusters(item_entry))
+
+        # Пометить запись как свободную и обновить счетчик записей
+        self._set_entry(dir_cluster, slot, None)
+        self.update_dir_entry_count(dir_cluster, -1)
+
+        return True, f"{'Каталог' if is_dir else 'Файл'} успешно удален"
+
+    @_instrumented
+    @_transactional
+    def delete_directory_contents(self, dir_cluster):
+        """Рекурсивное удаление содержимого каталога"""
+        cached = self._dir(dir_cluster)
+        entries = [(slot, entry) for slot, entry in enumerate(cached.slots)
+                   if entry is not None and entry.name not in ('', '.', '..')]
+
+        # Участки всего поддерева собираются за один обход и освобождаются пакетом
+        extents = []
+        removed = set()
+        for slot, entry in entries:
+            if entry.is_dir:
+                removed.update(self._collect_tree(entry.start_cluster, extents))
+            else:
+                extents.append((entry.start_cluster, self._entry_clusters(entry)))
+        self.free_extents(extents)
+
+        # Обнуляются только записи самого каталога
+        for slot, entry in entries:
+            self._set_entry(dir_cluster, slot, None)
+        if removed:
+            self._path_cache.clear()
+            # Текущий каталог внутри удаленного поддерева - переход в dir_cluster
+            if any(cluster in removed for cluster, _ in self.dir_stack):
+                paths = [path for cluster, path in self.dir_stack if cluster == dir_cluster]
+                self.change_directory(paths[0] if paths else '/')
+
+        # Обновляем счетчик записей в каталоге
+        self.update_dir_entry_count(dir_cluster, -len(entries))
+
+        return True, "Содержимое каталога удалено"
+
+    @_instrumented
+    @_transactional
+    def rename_item(self, old_name, new_name):
+        """Переименование файла или каталога (old_name - имя или путь)"""
+        if len(new_name) > self.max_name_len:
+            return False, "Новое имя слишком длинное"
+
+        if not self._valid_name(new_name):
+            return False, "Недопустимое имя"
+
+        old_path = self._abspath(old_name)
+        dir_cluster, old_name = self._split_path(old_path)
+        if dir_cluster is None:
+            return False, "Элемент не найден"
+
+        # Проверить, существует ли уже элемент с таким именем
+        if self._lookup(dir_cluster, new_name)[1] is not None:
+            return False, "Элемент с таким именем уже существует"
+
+        slot, entry = self._lookup(dir_cluster, old_name)
+        if entry is None or old_name in ('.', '..'):
+            return False, "Элемент не найден"
+
+        self._set_entry(dir_cluster, slot, entry.replace(name=new_name))
+        if entry.is_dir:
+            self._invalidate_paths(old_path, posixpath.join(posixpath.dirname(old_path), new_name))
+        return True, "Успешно переименовано"
+
+    @_instrumented
+    @_transactional
+    def create_directory(self, dir_name, parent_dir_cluster=None):
+        """Создание каталога (dir_name - имя или путь)"""
+        parent_dir_cluster, dir_name = self._split_path(dir_name, parent_dir_cluster)
+        if parent_dir_cluster is None:
+            return False, "Родительский каталог не найден"
+
+        if len(dir_name) > self.max_name_len:
+            return False, "Имя каталога слишком длинное"
+
+        if not self._valid_name(dir_name):
+            return False, "Недопустимое имя каталога"
+
+        # Проверить, существует ли уже каталог с таким именем
+        if self._lookup(parent_dir_cluster, dir_name)[1] is not None:
+            return False, "Каталог с таким именем уже существует"
+
+        # Первый блок нового каталога - один кластер
+        clusters_needed = 1
+
+        # Найти свободную запись в родительском каталоге
+        entry_idx = self.find_free_dir_entry(parent_dir_cluster)
+        if entry_idx is None:
+            return False, "Каталог полон"
+
+        first_cluster = self.allocate_extent(clusters_needed)
+        if first_cluster is None:
+            return False, "Недостаточно свободного места"
+
+        parent_entry = self._lookup(parent_dir_cluster, '.')[1]
+        slots = [None] * (self.cluster_size // self.dir_entry_size - 1)
+        # Запись текущего каталога '.'
+        slots[0] = self._make_entry('.', True, first_cluster,
+                                    first_cluster + clusters_needed - 1, 2)  # '.' и '..'
+        # Запись родительского каталога '..'
+        slots[1] = self._make_entry('..', True, parent_dir_cluster,
+                                    parent_entry.end_cluster, 2)
+
+        # Записать каталог на диск (участок непрерывный - одна запись)
+        new_dir = bytearray(clusters_needed * self.cluster_size)
+        new_dir[0:self.dir_entry_size] = self._pack_entry(slots[0])
+        new_dir[self.dir_entry_size:2 * self.dir_entry_size] = self._pack_entry(slots[1])
+        self._write_meta(first_cluster * self.cluster_size, new_dir)
+        cached = _DirCache()
+        cached.add_block(first_cluster, clusters_needed, first_cluster * self.cluster_size, slots)
+        self._dcache[first_cluster] = cached
+
+        # Записать запись в родительский каталог
+        self._set_entry(parent_dir_cluster, entry_idx,
+                        self._make_entry(dir_name, True, first_cluster,
+                                         first_cluster + clusters_needed - 1, 2))
+
+        # Обновить счетчик записей в родительском каталоге
+        self.update_dir_entry_count(parent_dir_cluster, 1)
+
+        return True, "Каталог успешно создан"
+
+    @_instrumented
+    @_shared
+    def change_directory(self, dir_name):
+        """Смена текущего каталога (имя, '..', '/' или путь)"""
+        if dir_name == ".." and len(self.dir_stack) == 1:
+            return False, "Уже в корневом каталоге"
+
+        path = self._abspath(dir_name)
+        if self._resolve_dir(path) is None:
+            return False, "Каталог не найден"
+
+        # Стек навигации - все префиксы пути (их кластеры уже в кэше путей)
+        self.dir_stack = [(self.root_dir_cluster, "/")]
+        prefix = ""
+        for component in path.split("/")[1:] if path != "/" else []:
+            prefix += "/" + component
+            self.dir_stack.append((self._resolve_dir(prefix), prefix))
+        self.current_dir_cluster = self.dir_stack[-1][0]
+
+        if dir_name == "..":
+            return True, "Переход в родительский каталог"
+        if path == "/":
+            return True, "Переход в корневой каталог"
+        return True, f"Переход в каталог {dir_name}"
+
+    def get_current_path(self):
+        """Получить текущий путь"""
+        return self.dir_stack[-1][1]
+
+    @_instrumented
+    @_transactional
+    def move_item(self, src_name, dest_dir, dest_name=None):
+        """Перемещение файла или каталога
+
+        src_name - имя или путь, dest_dir - кластер или путь целевого каталога.
+        """
+        if dest_name is None:
+            dest_name = posixpath.basename(src_name.rstrip('/'))
+
+        if len(dest_name) > self.max_name_len:
+            return False, "Имя файла слишком длинное"
+
+        if not self._valid_name(dest_name):
+            return False, "Недопустимое имя"
+
+        # Найти исходный элемент
+        src_path = self._abspath(src_name)
+        src_dir_cluster, src_name = self._split_path(src_path)
+        src_slot, src_entry = (None, None) if src_dir_cluster is None else \
+            self._lookup(src_dir_cluster, src_name)
+        if not src_entry or src_name in ('.', '..'):
+            return False, "Исходный элемент не найден"
+
+        dest_path = None
+        if isinstance(dest_dir, str):
+            dest_path = self._abspath(dest_dir)
+            dest_dir = self._resolve_dir(dest_path)
+            if dest_dir is None:
+                return False, "Целевой каталог не найден"
+
+        # Каталог нельзя переместить в самого себя или в свой подкаталог
+        if src_entry.is_dir:
+            cluster = dest_dir
+            while True:
+                if cluster == src_entry.start_cluster:
+                    return False, "Нельзя переместить каталог в самого себя"
+                if cluster == self.root_dir_cluster:
+                    break
+                cluster = self.get_parent_directory(cluster)
+
+        # Проверить, существует ли уже элемент с таким именем в целевом каталоге
+        if self._lookup(dest_dir, dest_name)[1] is not None:
+            return False, "Элемент с таким именем уже существует в целевом каталоге"
+
+        # Найти свободную запись в целевом каталоге
+        entry_idx = self.find_free_dir_entry(dest_dir)
+        if entry_idx is None:
+            return False, "Целевой каталог полон"
+
+        # Записываем в целевой каталог (с новым именем, если нужно)
+        self._set_entry(dest_dir, entry_idx, src_entry.replace(name=dest_name))
+
+        # Удаляем исходную запись
+        self._set_entry(src_dir_cluster, src_slot, None)
+
+        # Обновляем счетчики записей
+        self.update_dir_entry_count(src_dir_cluster, -1)
+        self.update_dir_entry_count(dest_dir, 1)
+
+        if src_entry.is_dir:
+            # Запись '..' перемещенного каталога указывает на новый родительский
+            moved = src_entry.start_cluster
+            dotdot_slot, dotdot = self._lookup(moved, '..')
+            dest_self = self._lookup(dest_dir, '.')[1]
+            self._set_entry(moved, dotdot_slot,
+                            dotdot.replace(start_cluster=dest_dir,
+                                           end_cluster=dest_self.end_cluster))
+            self._invalidate_paths(src_path, None if dest_path is None
+                                   else posixpath.join(dest_path, dest_name))
+
+        return True, "Элемент успешно перемещен"
+
+    @_instrumented
+    def import_tree(self, host_dir, dest_path, progress=None, workers=IO_WORKERS):
+        """Рекурсивный импорт каталога хоста в ФС
+
+        Содержимое host_dir копируется в каталог dest_path (создается при
+        отсутствии). За один проход планирования создаются каталоги и
+        выделяются участки под все файлы - по возможности одним общим
+        непрерывным участком. Затем файлы читаются пулом потоков прямо в
+        образ, а все записи каталогов фиксируются одной транзакцией.
+        progress(done, total, bytes_per_sec) вызывается в вызывающем потоке.
+        """
+        if not os.path.isdir(host_dir):
+            return False, "Исходный каталог не найден"
+
+        try:
+            with self.transaction():
+                return self._import_tree(host_dir, dest_path, progress, workers)
+        except _Abort as e:
+            return False, str(e)
+
+    def _import_tree(self, host_dir, dest_path, progress, workers):
+        dest_path = self._abspath(dest_path)
+        if self._resolve_dir(dest_path) is None:
+            success, message = self.create_directory(dest_path)
+            if not success:
+                raise _Abort(message)
+
+        # 1. Обход дерева хоста: каталоги создаются сразу, файлы планируются
+        dirs = {host_dir: self._resolve_dir(dest_path)}
+        files = []  # [путь на хосте, кластер каталога, имя, размер, первый кластер]
+        skipped = []
+        created_dirs = 0
+
+        for host_path, dirnames, filenames in os.walk(host_dir):
+            dir_cluster = dirs[host_path]
+
+            kept = []
+            for name in dirnames:
+                child = os.path.join(host_path, name)
+                entry = self._lookup(dir_cluster, name)[1]
+                if entry is None:
+                    success, message = self.create_directory(name, dir_cluster)
+                    if not success:
+                        skipped.append((child, message))
+                        continue
+                    entry = self._lookup(dir_cluster, name)[1]
+                    created_dirs += 1
+                elif not entry.is_dir:
+                    skipped.append((child, "Файл с таким именем уже существует"))
+                    continue
+                dirs[child] = entry.start_cluster
+                kept.append(name)
+            dirnames[:] = kept  # пропущенные каталоги не обходим
+
+            for name in filenames:
+                host_file = os.path.join(host_path, name)
+                if len(name) > self.max_name_len or not self._valid_name(name):
+                    skipped.append((host_file, "Недопустимое имя файла"))
+                    continue
+                if self._lookup(dir_cluster, name)[1] is not None:
+                    skipped.append((host_file, "Файл с таким именем уже существует"))
+                    continue
+                try:
+                    size = os.stat(host_file).st_size
+                except OSError:
+                    skipped.append((host_file, "Не удалось прочитать исходный файл"))
+                    continue
+                if size > MAX_FILE_SIZE:
+                    skipped.append((host_file, "Файл слишком большой"))
+                    continue
+                files.append([host_file, dir_cluster, name, size, 0])
+
+        # 2. Выделение участков: сначала одним общим участком, иначе по файлу
+        counts = [(item[3] + self.cluster_size - 1) // self.cluster_size for item in files]
+        total_clusters = sum(counts)
+        if total_clusters > self.free_count:
+            raise _Abort("Недостаточно свободного места")
+
+        start = self.allocate_extent(total_clusters) if total_clusters else None
+        for item, count in zip(files, counts):
+            if not count:
+                continue
+            if start is not None:
+                item[4] = start
+                start += count
+            else:
+                item[4] = self.allocate_extent(count)
+                if item[4] is None:
+                    raise _Abort("Недостаточно свободного места")
+
+        # 3. Параллельное чтение файлов прямо в выделенные участки
+        def copy(item):
+            with self._open_host(item[0], 'rb') as src:
+                return self._copy_in(src, item[4] * self.cluster_size, item[3])
+
+        total_bytes = sum(item[3] for item in files)
+        copied = [False] * len(files)
+        started = time.monotonic()
+        done = 0
+
+        pool = ThreadPoolExecutor(max_workers=workers)
+        try:
+            futures = {pool.submit(copy, item): i for i, item in enumerate(files)}
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    copied[i] = future.result() == files[i][3]
+                except OSError:
+                    pass
+                done += files[i][3]
+                _report_progress(progress, done, total_bytes, started)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+        # 4. Записи каталогов в порядке обхода, счетчики - по одному на каталог
+        added = {}
+        for item, count, ok in zip(files, counts, copied):
+            host_file, dir_cluster, name, size, first_cluster = item
+            if not ok:
+                self.free_extent(first_cluster, count)
+                skipped.append((host_file, "Не удалось прочитать исходный файл"))
+                continue
+
+            slot = self.find_free_dir_entry(dir_cluster)
+            if slot is None:
+                raise _Abort("Недостаточно свободного места")
+            self._set_entry(dir_cluster, slot,
+                            self._make_entry(name, False, first_cluster,
+                                             first_cluster + max(count, 1) - 1, size))
+            added[dir_cluster] = added.get(dir_cluster, 0) + 1
+
+        for dir_cluster, count in added.items():
+            self.update_dir_entry_count(dir_cluster, count)
+
+        message = (f"Импортировано файлов: {sum(added.values())}, "
+                   f"каталогов: {created_dirs}, байт: {total_bytes}")
+        if skipped:
+            message += f", пропущено: {len(skipped)} (первый: {skipped[0][0]} - {skipped[0][1]})"
+        return True, message
+
+    @_instrumented
+    @_shared
+    def export_tree(self, src_path, host_dir, progress=None, workers=IO_WORKERS,
+                    zero_copy=True):
+        """Рекурсивный экспорт каталога ФС на хост
+
+        Поддерево src_path обходится один раз: каталоги хоста создаются
+        сразу, файлы собираются в список. Затем пул потоков копирует
+        участки образа в файлы хоста (по возможности в ядре), так что
+        чтение образа одними потоками перекрывается записью другими.
+        progress(done, total, bytes_per_sec) вызывается в вызывающем потоке.
+        """
+        src_cluster = self._resolve_dir(self._abspath(src_path))
+        if src_cluster is None:
+            return False, "Исходный каталог не найден"
+
+        # 1. Обход поддерева
+        files = []  # (путь на хосте, позиция в образе, размер)
+        skipped = []
+        dirs = 0
+        queue = deque([(src_cluster, host_dir)])
+        while queue:
+            dir_cluster, host_path = queue.popleft()
+            try:
+                os.makedirs(host_path, exist_ok=True)
+            except OSError:
+                skipped.append((host_path, "Не удалось создать каталог"))
+                continue
+            dirs += 1
+            for entry in self.read_dir(dir_cluster):
+                target = os.path.join(host_path, entry.name)
+                if entry.is_dir:
+                    queue.append((entry.start_cluster, target))
+                else:
+                    files.append((target, entry.start_cluster * self.cluster_size,
+                                  entry.size))
+
+        # 2. Параллельное копирование
+        def copy(item):
+            target, pos, size = item
+            with self._open_host(target, 'wb') as f:
+                return self._copy_out(f, pos, size, None, zero_copy)
+
+        total_bytes = sum(item[2] for item in files)
+        started = time.monotonic()
+        exported = 0
+        done = 0
+
+        pool = ThreadPoolExecutor(max_workers=workers)
+        try:
+            futures = {pool.submit(copy, item): item for item in files}
+            for future in as_completed(futures):
+                item = futures[future]
+                try:
+                    if future.result() == item[2]:
+                        exported += 1
+                    else:
+                        skipped.append((item[0], "Файл скопирован не полностью"))
+                except OSError:
+                    skipped.append((item[0], "Не удалось записать файл"))
+                done += item[2]
+                _report_progress(progress, done, total_bytes, started)
+        finally:
+            # При отмене еще не начатые копирования не выполняются
+            pool.shutdown(wait=True, cancel_futures=True)
+
+        elapsed = time.monotonic() - started
+        speed = total_bytes / elapsed / (1024 * 1024) if elapsed > 0 else 0.0
+        message = (f"Экспортировано файлов: {exported}, каталогов: {dirs}, "
+                   f"байт: {total_bytes}, {elapsed:.2f} с ({speed:.1f} МБ/с)")
+        if skipped:
+            message += f", ошибок: {len(skipped)} (первая: {skipped[0][0]} - {skipped[0][1]})"
+        return True, message
+
+    @_instrumented
+    @_exclusive
+    def defragment(self, progress=None):
+        """Уплотнение образа: перенос всех участков к началу области данных
+
+        Участки файлов и блоки каталогов сдвигаются по возрастанию адреса
+        большими последовательными копиями, после чего все каталоги
+        переписываются с новыми номерами кластеров (записи файлов и
+        подкаталогов, '.', '..' и ссылки цепочек), а свободное место
+        собирается в один участок в конце. progress(done, total,
+        bytes_per_sec) получает объем пройденных данных и не должен
+        прерывать операцию (OperationCancelled здесь не поддерживается).
+        Выполняется вне транзакции; прерывание посреди переноса оставляет
+        образ несогласованным, поэтому изменения сбрасываются только в конце.
+        """
+        if self._tx_depth:
+            return False, "Дефрагментация невозможна внутри транзакции"
+
+        before = self.fragmentation()
+
+        # 1. Обход дерева: все каталоги и все занятые участки
+        dirs = []
+        extents = []
+        stack = [self.root_dir_cluster]
+        while stack:
+            cluster = stack.pop()
+            cached = self._dir(cluster)
+            dirs.append(cluster)
+            extents.extend((start, clusters) for start, clusters, _ in cached.blocks)
+            for entry in cached.slots:
+                if entry is None or entry.name in ('', '.', '..'):
+                    continue
+                if entry.is_dir:
+                    stack.append(entry.start_cluster)
+                elif entry.size:
+                    extents.append((entry.start_cluster, self._entry_clusters(entry)))
+
+        extents.sort()
+        for (start, count), (next_start, _) in zip(extents, extents[1:]):
+            if start + count > next_start:
+                return False, "Участки пересекаются - образ поврежден"
+
+        # 2. Перенос участков к началу; remap - старое начало -> новое
+        remap = {}
+        cursor = self.root_dir_cluster
+        total = sum(count for _, count in extents) * self.cluster_size
+        started = time.monotonic()
+        done = moved = 0
+        for start, count in extents:
+            if start != cursor:
+                self._move(start * self.cluster_size, cursor * self.cluster_size,
+                           count * self.cluster_size)
+                remap[start] = cursor
+                moved += 1
+            cursor += count
+            done += count * self.cluster_size
+            _report_progress(progress, done, total, started)
+
+        # 3. Перезапись каталогов с новыми номерами кластеров
+        def relocate(entry):
+            if entry is None or entry.start_cluster not in remap:
+                return entry
+            new_start = remap[entry.start_cluster]
+            return entry.replace(start_cluster=new_start,
+                                 end_cluster=new_start + entry.end_cluster - entry.start_cluster)
+
+        size = self.dir_entry_size
+        for cluster in dirs:
+            cached = self._dcache[cluster]
+            for i, (start, clusters, _) in enumerate(cached.blocks):
+                block = bytearray(clusters * self.cluster_size)
+                first = cached.first_slots[i]
+                nslots = len(block) // size
+                for j, entry in enumerate(cached.slots[first:first + nslots - 1]):
+                    entry = relocate(entry)
+                    if entry is not None:
+                        block[j * size:(j + 1) * size] = self._pack_entry(entry)
+                if i + 1 < len(cached.blocks):
+                    next_start, next_clusters, _ = cached.blocks[i + 1]
+                    next_start = remap.get(next_start, next_start)
+                    block[(nslots - 1) * size:nslots * size] = \
+                        self._pack_link(next_start, next_start + next_clusters - 1)
+                self._write(remap.get(start, start) * self.cluster_size, block)
+
+        # 4. Битовая карта: занято все до cursor, дальше - один свободный участок
+        self._set_range(self.root_dir_cluster, cursor - self.root_dir_cluster, free=False)
+        if cursor < self.total_clusters:
+            self._set_range(cursor, self.total_clusters - cursor, free=True)
+        self.free_count = self.total_clusters - cursor
+        self._extents = FreeExtentIndex()
+        self._extents.free(cursor, self.total_clusters - cursor)
+
+        self._dcache = {}
+        self._path_cache.clear()
+        self.dir_stack = [(remap.get(cluster, cluster), path) for cluster, path in self.dir_stack]
+        self.current_dir_cluster = self.dir_stack[-1][0]
+        self.sync()
+
+        after = self.fragmentation()
+        return True, (f"Перемещено участков: {moved} из {len(extents)}. "
+                      f"Свободных участков: {before[0]} -> {after[0]}, "
+                      f"наибольший: {before[1]} -> {after[1]} кластеров")
+
+    @_instrumented
+    def check(self, repair=False):
+        """Проверка целостности образа (fsck)
+
+        Дерево каталогов обходится один раз от корня; по найденным участкам
+        строится ожидаемая битовая карта и сравнивается с записанной.
+        Сообщается о потерянных кластерах (заняты, но никому не
+        принадлежат), занятых, но помеченных свободными, пересекающихся
+        участках, неверных счетчиках '.' и ссылках '..'. При repair
+        исправимые ошибки исправляются одной транзакцией; пересечения
+        только сообщаются. Возвращает (образ согласован, отчет). Проверка
+        идет под разделяемой блокировкой образа, исправление - под
+        исключительной.
+        """
+        if self._tx_depth:
+            return False, "Проверка невозможна внутри транзакции"
+
+        with self.lock(exclusive=repair):
+            return self._check(repair)
+
+    def _check(self, repair):
+        # Проверяется состояние на диске, а не кэш
+        self._dcache = {}
+        self._path_cache.clear()
+        self._load_bitmap()
+
+        problems = []  # (описание, исправление или None)
+        extents = []  # (начало, число кластеров, путь)
+        visited = set()
+        files = 0
+        stack = [(self.root_dir_cluster, self.root_dir_cluster, '/')]
+
+        def in_range(start, count):
+            return self.root_dir_cluster <= start and start + count <= self.total_clusters
+
+        while stack:
+            cluster, parent, path = stack.pop()
+            if cluster in visited:
+                problems.append((f"{path}: каталог встречается в дереве повторно", None))
+                continue
+            visited.add(cluster)
+
+            cached = self._dir(cluster)
+            extents.extend((start, clusters, path) for start, clusters, _ in cached.blocks)
+            if cached.broken is not None:
+                # Исправление - конец цепочки на последнем целом блоке
+                problems.append((f"{path}: цепочка блоков оборвана: {cached.broken}",
+                                 (cluster, len(cached.slots) - 1, None)))
+
+            occupied = 0
+            dot_fix = None  # исправленная запись '.', если ссылка в ней неверна
+            for slot, entry in enumerate(cached.slots):
+                if entry is None:
+                    continue
+                occupied += 1
+                name = entry.name
+                child = posixpath.join(path, name)
+
+                if name == '.':
+                    if entry.start_cluster != cluster:
+                        dot_fix = entry.replace(start_cluster=cluster, end_cluster=cluster)
+                        problems.append((f"{path}: запись '.' указывает на кластер "
+                                         f"{entry.start_cluster} вместо {cluster}",
+                                         (cluster, slot, dot_fix)))
+                elif name == '..':
+                    if entry.start_cluster != parent:
+                        problems.append((f"{path}: запись '..' указывает на кластер "
+                                         f"{entry.start_cluster} вместо {parent}",
+                                         (cluster, slot, entry.replace(start_cluster=parent,
+                                                                       end_cluster=parent))))
+                elif entry.is_dir:
+                    if not in_range(entry.start_cluster, 1):
+                        problems.append((f"{child}: каталог вне области данных",
+                                         (cluster, slot, None)))
+                        occupied -= 1  # запись будет удалена
+                        continue
+                    stack.append((entry.start_cluster, cluster, child))
+                else:
+                    files += 1
+                    count = self._entry_clusters(entry)
+                    if not count:
+                        continue
+                    if (not in_range(entry.start_cluster, count)
+                            or entry.end_cluster != entry.start_cluster + count - 1):
+                        problems.append((f"{child}: участок файла не соответствует размеру",
+                                         (cluster, slot, None)))
+                        occupied -= 1
+                        continue
+                    extents.append((entry.start_cluster, count, child))
+
+            dot_slot, dot = self._lookup(cluster, '.')
+            if dot_fix is not None:
+                # Счетчик исправляется поверх исправленной ссылки, а не вместо нее
+                dot = dot_fix
+            if dot is not None and dot.num_entries != occupied:
+                problems.append((f"{path}: счетчик записей {dot.num_entries}, "
+                                 f"фактически {occupied}",
+                                 (cluster, dot_slot, dot.replace(num_entries=occupied))))
+
+        # Пересечения участков - по отсортированному списку
+        extents.sort()
+        overlaps = 0
+        prev_end, prev_path = 0, None
+        for start, count, path in extents:
+            if start < prev_end:
+                overlaps += 1
+                problems.append((f"{path}: участок {start}-{start + count - 1} "
+                                 f"пересекается с {prev_path}", None))
+            if start + count > prev_end:
+                prev_end, prev_path = start + count, path
+
+        # Ожидаемая битовая карта: служебная область и все найденные участки заняты
+        expected = bytearray(b'\xff' * self.bitmap_bytes)
+        _set_bits(expected, 0, self.root_dir_cluster, free=False)
+        for start, count, _ in extents:
+            _set_bits(expected, start, count, free=False)
+
+        mask = (1 << self.total_clusters) - 1
+        stored_free = int.from_bytes(self._bitmap, 'little') & mask
+        expected_free = int.from_bytes(expected, 'little') & mask
+        leaked = (expected_free & ~stored_free).bit_count()
+        unmarked = (stored_free & ~expected_free).bit_count()
+        if leaked:
+            problems.append((f"Потерянных кластеров (заняты, но не используются): {leaked}",
+                             'bitmap'))
+        if unmarked:
+            problems.append((f"Используемых кластеров, помеченных свободными: {unmarked}",
+                             'bitmap'))
+
+        summary = f"каталогов: {len(visited)}, файлов: {files}"
+        if not problems:
+            return True, f"Ошибок не найдено ({summary})"
+
+        report = [f"Найдено ошибок: {len(problems)} ({summary})"]
+        report.extend(text for text, _ in problems[:20])
+        if len(problems) > 20:
+            report.append(f"... и еще {len(problems) - 20}")
+
+        if not repair:
+            return False, "\n".join(report)
+
+        with self.transaction():
+            for _, fix in problems:
+                if fix is None or fix == 'bitmap':
+                    continue
+                cluster, slot, entry = fix
+                self._set_entry(cluster, slot, entry)
+            if leaked or unmarked:
+                self._bitmap[:] = expected
+                self._mark_bitmap_dirty(0, self.bitmap_bytes)
+        self._load_bitmap()
+
+        report.append("Исправлено, кроме пересечений участков" if overlaps
+                      else "Все ошибки исправлены")
+        return not overlaps and not any(fix is None for _, fix in problems), "\n".join(report)
+
+    @_shared
+    def get_parent_directory(self, dir_cluster):
+        """Получить кластер родительского каталога"""
+        entry = self._lookup(dir_cluster, '..')[1]
+        if entry is None:
+            return self.root_dir_cluster
+        return entry.start_cluster